@@ -1,18 +1,21 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.contrib import admin
 from django.urls import path
-from django.shortcuts import render, reverse
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render, reverse
 from django.utils.html import format_html
 from django.contrib.admin import AdminSite
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.db.models import Count
-from django.utils import timezone
+from django.db import IntegrityError, transaction
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_protect
+from functools import update_wrapper
 import logging
 import json
-import re
-from datetime import timedelta
-from decouple import config
-import google.generativeai as genai
-from .models import UserProfile, Puzzle, Submission
+from .models import UserProfile, Puzzle, Submission, GenerationJob, Attempt
+from . import generation, llm, ranking, stats
 
 logger = logging.getLogger(__name__)
 
@@ -30,43 +33,54 @@ class CustomAdminSite(AdminSite):
             path('manage-puzzles/', self.admin_view(self.manage_puzzles_view), name='manage-puzzles'),
             path('manage-submissions/', self.admin_view(self.manage_submissions_view), name='manage-submissions'),
             path('generate-puzzles/', self.admin_view(self.generate_puzzle_view), name='generate-puzzles'),
+            path('generation-jobs/<int:job_id>/', self.admin_view(self.generation_job_view), name='generation-job'),
+            path('generation-jobs/<int:job_id>/status/', self.admin_view(self.generation_job_status_view),
+                 name='generation-job-status'),
+            path('generation-jobs/<int:job_id>/retry/', self.admin_view(self.retry_generation_job_view),
+                 name='generation-job-retry'),
             path('edit-puzzle/<int:puzzle_id>/', self.admin_view(self.edit_puzzle_view), name='edit-puzzle'),
             path('delete-puzzle/<int:puzzle_id>/', self.admin_view(self.delete_puzzle_view), name='delete-puzzle'),
         ]
         return custom_urls + default_urls
 
+    def admin_view(self, view, cacheable=False):
+        """Like AdminSite.admin_view, but keeps async views async."""
+        if not iscoroutinefunction(view):
+            return super().admin_view(view, cacheable)
+
+        async def inner(request, *args, **kwargs):
+            # has_permission() reads request.user, which may hit the database
+            if not await sync_to_async(self.has_permission)(request):
+                from django.contrib.auth.views import redirect_to_login
+                return redirect_to_login(
+                    request.get_full_path(),
+                    reverse('admin:login', current_app=self.name),
+                )
+            return await view(request, *args, **kwargs)
+
+        if not cacheable:
+            inner = never_cache(inner)
+        if not getattr(view, 'csrf_exempt', False):
+            inner = csrf_protect(inner)
+        return update_wrapper(inner, view)
+
     def custom_dashboard_view(self, request):
         try:
             context = self.each_context(request)
-            submissions_list = Submission.objects.select_related('user', 'puzzle').order_by('-submitted_at')
-            paginator = Paginator(submissions_list, 10)
-            page_num = request.GET.get('page', 1)
-            submissions_page = paginator.get_page(page_num)
-
-            total_users = UserProfile.objects.count()
-            total_puzzles = Puzzle.objects.count()
-            total_submissions = Submission.objects.count()
-            thirty_days_ago = timezone.now() - timedelta(days=30)
-
-            top_users = UserProfile.objects.filter(
-                user__submission__submitted_at__gte=thirty_days_ago
-            ).annotate(
-                solved_count=Count('user__submission', filter=Submission.objects.filter(is_correct=True))
-            ).order_by('-solved_count')[:5]
+            # Counters and 30-day rollups come from the precomputed snapshot row
+            snapshot = stats.get_snapshot()
+            recent_submissions = (Submission.objects.select_related('user', 'puzzle')
+                                  .only('is_correct', 'submitted_at', 'user__username', 'puzzle__title')
+                                  .order_by('-submitted_at', '-id')[:10])
 
             context.update({
                 'title': "Puzzle Management Dashboard",
-                'user_profiles': UserProfile.objects.all(),
-                'puzzles': Puzzle.objects.all(),
-                'submissions': submissions_page,
-                'beginner_puzzles': Puzzle.objects.filter(level='beginner', puzzle_type='mcq'),
-                'intermediate_puzzles': Puzzle.objects.filter(level='intermediate', puzzle_type='code'),
-                'expert_puzzles': Puzzle.objects.filter(level='expert', puzzle_type='code'),
-                'total_users': total_users,
-                'total_puzzles': total_puzzles,
-                'total_submissions': total_submissions,
-                'top_users': top_users,
-                'page_obj': submissions_page,
+                'stats': snapshot,
+                'submissions': recent_submissions,
+                'total_users': snapshot.total_users,
+                'total_puzzles': snapshot.total_puzzles,
+                'total_submissions': snapshot.total_submissions,
+                'top_users': snapshot.top_solvers,
                 'available_apps': self.get_app_list(request),
                 'is_popup': False,
             })
@@ -79,7 +93,8 @@ class CustomAdminSite(AdminSite):
     def manage_users_view(self, request):
         try:
             context = self.each_context(request)
-            profiles = UserProfile.objects.select_related('user').all()
+            # Leaderboard order, so the page is read off puzzle_profile_rank_idx
+            profiles = UserProfile.objects.select_related('user').order_by('-total_points', 'id')
             paginator = Paginator(profiles, 10)
             page_num = request.GET.get('page', 1)
             page_obj = paginator.get_page(page_num)
@@ -101,7 +116,7 @@ class CustomAdminSite(AdminSite):
             category = request.GET.get('category', 'all')
             level = request.GET.get('level', None)
 
-            puzzles = Puzzle.objects.all()
+            puzzles = Puzzle.objects.order_by('level', '-created_at', '-id')
             if category != 'all':
                 puzzles = puzzles.filter(category=category)
                 if level:
@@ -127,7 +142,7 @@ class CustomAdminSite(AdminSite):
     def manage_submissions_view(self, request):
         try:
             context = self.each_context(request)
-            submissions = Submission.objects.select_related('user', 'puzzle').order_by('-submitted_at')
+            submissions = Submission.objects.select_related('user', 'puzzle').order_by('-submitted_at', '-id')
             paginator = Paginator(submissions, 10)
             page_num = request.GET.get('page', 1)
             page_obj = paginator.get_page(page_num)
@@ -146,100 +161,25 @@ class CustomAdminSite(AdminSite):
     def generate_puzzle_view(self, request):
         try:
             context = self.each_context(request)
-            context.update({'title': "Generate Puzzles"})
+            max_puzzles = generation.get_settings()['MAX_PUZZLES']
+            context.update({
+                'title': "Generate Puzzles",
+                'max_puzzles': max_puzzles,
+                'jobs': GenerationJob.objects.select_related('created_by')[:10],
+            })
 
             if request.method == 'POST':
                 num_puzzles = int(request.POST.get('num_puzzles', 15))
                 category = request.POST.get('category', 'PY')
                 level = request.POST.get('level', 'beginner')
-                cat_name = dict(Puzzle.CATEGORIES).get(category, 'Python')
-
-                # Configure Gemini
-                genai.configure(api_key=config('GEMINI_API_KEY'))
-                model = genai.GenerativeModel('gemini-pro')
-                puzzles_created = 0
-                valid_puzzles = []
-                
-                # Get existing titles for duplicate check
-                existing_titles = set(Puzzle.objects.values_list('title', flat=True))
-
-                if level == 'beginner':
-                    prompt = f"""Return JSON only. Generate {num_puzzles} unique MCQs for {cat_name}.
-                    Each question MUST have a detailed description.
-                    Format: [{{"title": "short question", "description": "detailed explanation of the question", 
-                    "options": {{"A": "option1", "B": "option2", "C": "option3", "D": "option4"}}, 
-                    "correct_answer": "A/B/C/D"}}]"""
-                else:
-                    prompt = f"""Return JSON only. Generate {num_puzzles} unique {level} {cat_name} coding puzzles.
-                    Each puzzle MUST have a detailed description.
-                    Format: [{{"title": "short name", "description": "detailed problem statement with requirements", 
-                    "test_cases": {{"test1": {{"input": "example", "output": "result"}}, 
-                    "test2": {{"input": "example2", "output": "result2"}}}}}}]"""
-
-                max_retries = 3
-                for retry in range(max_retries):
-                    try:
-                        response = model.generate_content(prompt)
-                        raw_response = response.text.strip()
-                        
-                        # Simple JSON cleanup
-                        cleaned_response = raw_response.replace('```json', '').replace('```', '')
-                        puzzles_data = json.loads(cleaned_response)
-
-                        if not isinstance(puzzles_data, list):
-                            puzzles_data = [puzzles_data]
-
-                        for puzzle_data in puzzles_data:
-                            if puzzles_created >= num_puzzles:
-                                break
-
-                            # Validate required fields
-                            if not all(k in puzzle_data for k in ['title', 'description']):
-                                continue
-                            
-                            title = puzzle_data['title'].strip()
-                            description = puzzle_data['description'].strip()
-                            
-                            # Skip if title exists or description is empty
-                            if title in existing_titles or not description:
-                                continue
-
-                            test_cases = (puzzle_data.get('options', {}) if level == 'beginner' 
-                                        else puzzle_data.get('test_cases', {}))
-                            
-                            # Create puzzle with default description if needed
-                            Puzzle.objects.create(
-                                title=title,
-                                description=description or f"Practice question about {cat_name}",
-                                category=category,
-                                level=level,
-                                puzzle_type='mcq' if level == 'beginner' else 'code',
-                                points=10 if level == 'beginner' else (20 if level == 'intermediate' else 30),
-                                test_cases=test_cases,
-                                solution=puzzle_data.get('correct_answer', '') if level == 'beginner' else ''
-                            )
-                            
-                            puzzles_created += 1
-                            existing_titles.add(title)
-                            valid_puzzles.append(title)
-
-                        if puzzles_created >= num_puzzles:
-                            break
+                if not 1 <= num_puzzles <= max_puzzles:
+                    context.update({'error': f"Number of puzzles must be between 1 and {max_puzzles}"})
+                    return render(request, 'admin/generate_puzzles.html', context)
 
-                    except json.JSONDecodeError as e:
-                        if retry == max_retries - 1:
-                            logger.error(f"JSON parsing failed after {max_retries} attempts: {str(e)}")
-                            context.update({'error': f"Failed to generate valid puzzles after {max_retries} attempts"})
-                            return render(request, 'admin/generate_puzzles.html', context)
-                        continue
-
-                if puzzles_created == 0:
-                    context.update({'error': "No valid puzzles could be created"})
-                else:
-                    context.update({
-                        'success': f"Successfully created {puzzles_created} puzzles"
-                    })
-                return render(request, 'admin/generate_puzzles.html', context)
+                # Generation runs in the background; the job page shows progress per chunk
+                job = generation.create_job(category, level, num_puzzles, user=request.user)
+                generation.start_job(job)
+                return redirect('custom_admin:generation-job', job_id=job.pk)
 
             return render(request, 'admin/generate_puzzles.html', context)
 
@@ -248,7 +188,90 @@ class CustomAdminSite(AdminSite):
             context.update({'error': str(e)})
             return render(request, 'admin/generate_puzzles.html', context)
 
-    def edit_puzzle_view(self, request, puzzle_id):
+    def generation_job_view(self, request, job_id):
+        job = get_object_or_404(GenerationJob, pk=job_id)
+        context = self.each_context(request)
+        context.update({
+            'title': f"Generation Job #{job.pk}",
+            'job': job,
+        })
+        return render(request, 'admin/generation_job.html', context)
+
+    def generation_job_status_view(self, request, job_id):
+        job = get_object_or_404(GenerationJob, pk=job_id)
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress,
+            'requested': job.requested,
+            'created': job.created_count,
+            'error': job.error,
+            'chunks': job.chunks,
+        })
+
+    def retry_generation_job_view(self, request, job_id):
+        job = get_object_or_404(GenerationJob, pk=job_id)
+        if request.method == 'POST' and not generation.retry_job(job):
+            messages.warning(request, "This job is still running.")
+        return redirect('custom_admin:generation-job', job_id=job.pk)
+
+    @staticmethod
+    def _update_prompt(puzzle):
+        if puzzle.level == 'beginner':
+            return f"""
+            Return only valid JSON, no additional text:
+            Update this beginner-level MCQ about {dict(Puzzle.CATEGORIES)[puzzle.category]}:
+            - Current title: "{puzzle.title}"
+            - Current description: "{puzzle.description}"
+            - Current options: {json.dumps(puzzle.test_cases)}
+            - Current correct answer: "{puzzle.solution}"
+            Provide an improved version with:
+            - A clear question (title)
+            - A brief description
+            - 4 options (A, B, C, D) as a JSON dictionary
+            - The correct answer (A, B, C, or D)
+            Return as a single JSON object.
+            """
+        return f"""
+            Return only valid JSON, no additional text:
+            Update this {puzzle.level}-level {dict(Puzzle.CATEGORIES)[puzzle.category]} coding puzzle:
+            - Current title: "{puzzle.title}"
+            - Current description: "{puzzle.description}"
+            - Current test cases: {json.dumps(puzzle.test_cases)}
+            Provide an improved version with:
+            - A title
+            - A detailed problem description
+            - Test cases as a JSON dictionary with input-output pairs ({'3' if puzzle.level == 'intermediate' else '5'} minimum)
+            Return as a single JSON object.
+            """
+
+    async def edit_puzzle_view(self, request, puzzle_id):
+        # Async so an LLM rewrite is awaited on the event loop; the rest of the
+        # view runs in the request's sync thread
+        llm_response = llm_error = None
+        if request.method == 'POST' and request.POST.get('action') == 'update_with_llm':
+            puzzle = await Puzzle.objects.filter(id=puzzle_id).afirst()
+            if puzzle is not None:
+                try:
+                    llm_response = await llm.agenerate(self._update_prompt(puzzle), purpose='puzzle update')
+                except llm.LLMError as e:
+                    llm_error = e
+        return await sync_to_async(self._edit_puzzle)(request, puzzle_id, llm_response, llm_error)
+
+    @staticmethod
+    def _save_puzzle(puzzle):
+        """Save an edited puzzle unless its title repeats another's; returns an error message or None."""
+        try:
+            puzzle.clean()
+            with transaction.atomic():
+                puzzle.save()
+        except ValidationError as e:
+            return ' '.join(e.messages)
+        except IntegrityError:
+            # Another puzzle took the title since the check
+            return "A puzzle with this title already exists."
+        return None
+
+    def _edit_puzzle(self, request, puzzle_id, llm_response=None, llm_error=None):
         try:
             puzzle = Puzzle.objects.get(id=puzzle_id)
             context = self.each_context(request)
@@ -261,57 +284,28 @@ class CustomAdminSite(AdminSite):
                 action = request.POST.get('action')
                 
                 if action == 'update_with_llm':
-                    genai.configure(api_key=config('GEMINI_API_KEY'))
-                    model = genai.GenerativeModel('gemini-pro')
-                    
-                    if puzzle.level == 'beginner':
-                        prompt = f"""
-                        Return only valid JSON, no additional text:
-                        Update this beginner-level MCQ about {dict(Puzzle.CATEGORIES)[puzzle.category]}:
-                        - Current title: "{puzzle.title}"
-                        - Current description: "{puzzle.description}"
-                        - Current options: {json.dumps(puzzle.test_cases)}
-                        - Current correct answer: "{puzzle.solution}"
-                        Provide an improved version with:
-                        - A clear question (title)
-                        - A brief description
-                        - 4 options (A, B, C, D) as a JSON dictionary
-                        - The correct answer (A, B, C, or D)
-                        Return as a single JSON object.
-                        """
-                    else:
-                        prompt = f"""
-                        Return only valid JSON, no additional text:
-                        Update this {puzzle.level}-level {dict(Puzzle.CATEGORIES)[puzzle.category]} coding puzzle:
-                        - Current title: "{puzzle.title}"
-                        - Current description: "{puzzle.description}"
-                        - Current test cases: {json.dumps(puzzle.test_cases)}
-                        Provide an improved version with:
-                        - A title
-                        - A detailed problem description
-                        - Test cases as a JSON dictionary with input-output pairs ({'3' if puzzle.level == 'intermediate' else '5'} minimum)
-                        Return as a single JSON object.
-                        """
-
-                    response = model.generate_content(prompt)
-                    logger.info(f"Raw LLM update response for puzzle {puzzle.id}: {response.text}")
-
-                    if not response.text or response.text.strip() == "":
-                        logger.error(f"Empty LLM update response for puzzle {puzzle.id}")
-                        context.update({'error': "Empty LLM update response"})
+                    if llm_error is not None or llm_response is None:
+                        e = llm_error or llm.LLMError("no response")
+                        logger.error(f"LLM update failed for puzzle {puzzle.id}: {str(e)}")
+                        context.update({'error': f"LLM update failed: {str(e)}"})
                         return render(request, 'admin/edit_puzzle.html', context)
+                    response_text = llm_response
+                    logger.info(f"Raw LLM update response for puzzle {puzzle.id}: {response_text}")
 
                     try:
-                        updated_data = json.loads(response.text)
+                        updated_data = llm.extract_json(response_text)
                         puzzle.title = updated_data['title']
                         puzzle.description = updated_data['description']
                         puzzle.test_cases = updated_data.get('options', updated_data.get('test_cases', {}))
                         if puzzle.level == 'beginner':
                             puzzle.solution = updated_data.get('correct_answer', '')
-                        puzzle.save()
+                        error = self._save_puzzle(puzzle)
+                        if error:
+                            context.update({'error': error})
+                            return render(request, 'admin/edit_puzzle.html', context)
                         context.update({'success': "Puzzle updated successfully with LLM!"})
                     except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse LLM update response for puzzle {puzzle.id}: {str(e)} - Raw: {response.text}")
+                        logger.error(f"Failed to parse LLM update response for puzzle {puzzle.id}: {str(e)} - Raw: {response_text}")
                         context.update({'error': f"Failed to parse LLM update response: {str(e)}"})
                         return render(request, 'admin/edit_puzzle.html', context)
 
@@ -346,7 +340,10 @@ class CustomAdminSite(AdminSite):
                             return render(request, 'admin/edit_puzzle.html', context)
                         puzzle.solution = ''  # No solution for coding puzzles
 
-                    puzzle.save()
+                    error = self._save_puzzle(puzzle)
+                    if error:
+                        context.update({'error': error})
+                        return render(request, 'admin/edit_puzzle.html', context)
                     context.update({'success': "Puzzle updated successfully!"})
 
                 return render(request, 'admin/edit_puzzle.html', context)
@@ -395,13 +392,18 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ('total_points', 'puzzles_solved')
     readonly_fields = ('total_points', 'puzzles_solved')
 
+    def get_queryset(self, request):
+        # The rank comes with each row instead of one ScoreBucket query per row
+        return ranking.with_rank(super().get_queryset(request))
+
     def rank_display(self, obj):
         return format_html(
             '<span style="color: {}">{}</span>',
             '#FFD700' if obj.total_points > 1000 else '#C0C0C0',
-            f'Rank {obj.get_rank()}'
+            f'Rank {obj.rank}'
         )
     rank_display.short_description = 'Rank'
+    rank_display.admin_order_field = 'rank'
 
 class PuzzleAdmin(admin.ModelAdmin):
     list_display = ('title', 'category', 'level', 'puzzle_type', 'points', 'created_at')
@@ -415,9 +417,17 @@ class SubmissionAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'puzzle__title')
     date_hierarchy = 'submitted_at'
 
+class AttemptAdmin(admin.ModelAdmin):
+    list_display = ('user', 'puzzle', 'is_correct', 'status', 'engine', 'latency_ms', 'created_at')
+    list_filter = ('is_correct', 'status', 'engine', 'created_at')
+    search_fields = ('user__username', 'puzzle__title')
+    date_hierarchy = 'created_at'
+    list_select_related = ('user', 'puzzle')
+
 custom_admin_site = CustomAdminSite(name='custom_admin')
 custom_admin_site.register(UserProfile, UserProfileAdmin)
 custom_admin_site.register(Puzzle, PuzzleAdmin)
 custom_admin_site.register(Submission, SubmissionAdmin)
+custom_admin_site.register(Attempt, AttemptAdmin)
 
 admin.site.register(Puzzle)
\ No newline at end of file
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PuzzleConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "puzzle"
+
+    def ready(self):
+        from django.core import checks
+
+        from . import sandbox
+
+        checks.register(sandbox.check_interpreter)
@@ -0,0 +1,45 @@
+"""Authentication backend that accepts a username or an email address."""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+def email_matches(email):
+    """Users whose email equals email ignoring case.
+
+    Compares LOWER(email) so the lookup uses the functional index added by
+    migration 0020 on both SQLite and PostgreSQL; email__iexact would not.
+    """
+    return UserModel._default_manager.alias(email_lower=Lower('email')).filter(email_lower=email.lower())
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """ModelBackend that resolves the login name as a username or an email in one query.
+
+    An exact username match wins over an email match; otherwise the first
+    user with that email (ignoring case) whose password checks out.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+        # Both sides of the OR are indexed: the unique username index and LOWER(email)
+        candidates = list(
+            UserModel._default_manager.alias(email_lower=Lower('email'))
+            .filter(Q(username=username) | Q(email_lower=username.lower()))
+            .order_by('pk')[:5]
+        )
+        if not candidates:
+            # Run the hasher once anyway so unknown logins take as long as wrong passwords
+            UserModel().set_password(password)
+            return None
+        candidates.sort(key=lambda user: user.get_username() != username)
+        for user in candidates:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
@@ -0,0 +1,345 @@
+"""Request benchmarks: seed a synthetic dataset and time views through the test client.
+
+Each scenario is requested ``iterations`` times after a cache clear; the
+result records latency percentiles and the highest SQL query count seen.
+Query counts are deterministic for a given dataset, so comparing them
+against the committed baseline catches N+1 regressions; latency is only
+compared when a tolerance is given, since it depends on the machine.
+
+run_solve_load() is a throughput test rather than a per-view timing: it
+fires concurrent coding solves graded inline against a slow stub LLM through
+the WSGI path (a pool of sync worker threads) and the ASGI path (one event
+loop), the way a threaded WSGI worker and a single ASGI worker serve them.
+
+run_signups() posts the signup form for many people sharing one name and
+records the queries each signup costs, which should not grow with the
+number of earlier namesakes.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import llm, stats
+from .models import Puzzle, ScoreBucket, Submission, UserProfile
+from .solved_set import SolvedSet
+
+BASELINE_PATH = settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+
+# Small enough for the test suite; the command takes larger sizes
+DEFAULT_SIZES = {'puzzles': 60, 'users': 40, 'submissions': 400}
+
+LEVELS = ['beginner', 'intermediate', 'expert']
+POINTS = {'beginner': 10, 'intermediate': 20, 'expert': 30}
+MCQ_OPTIONS = {'A': 'First', 'B': 'Second', 'C': 'Third', 'D': 'Fourth'}
+BENCH_PASSWORD = 'benchmark-password'
+USER_PREFIX = 'bench_user_'
+ADMIN_USERNAME = 'bench_admin'
+SIGNUP_EMAIL_PREFIX = 'bench_signup_'
+
+
+def seed(puzzles, users, submissions, batch_size=5000, seed_value=42):
+    """Bulk-load a deterministic dataset and rebuild the derived tables.
+
+    Each user gets an even share of submissions on distinct puzzles; about
+    60% are correct, and profiles, solved sets and bitmaps, score buckets and the
+    dashboard snapshot are made consistent with them.
+    """
+    rng = random.Random(seed_value)
+    password = make_password(BENCH_PASSWORD)
+
+    puzzle_rows = []
+    for i in range(puzzles):
+        level = LEVELS[i % len(LEVELS)]
+        mcq = level == 'beginner'
+        puzzle_rows.append(Puzzle(
+            title=f'Benchmark puzzle {i}',
+            description=f'Synthetic {level} puzzle number {i}. ' * 8,
+            category=Puzzle.CATEGORIES[i % len(Puzzle.CATEGORIES)][0],
+            level=level,
+            puzzle_type='mcq' if mcq else 'code',
+            points=POINTS[level],
+            # Coding puzzles have no test cases so solving goes through the (stub) LLM
+            test_cases=MCQ_OPTIONS if mcq else {},
+            solution='A' if mcq else '',
+        ))
+    puzzle_rows = Puzzle.objects.bulk_create(puzzle_rows, batch_size=batch_size)
+    puzzle_ids = [puzzle.pk for puzzle in puzzle_rows]
+    puzzle_points = {puzzle.pk: puzzle.points for puzzle in puzzle_rows}
+    puzzle_mcq = {puzzle.pk: puzzle.puzzle_type == 'mcq' for puzzle in puzzle_rows}
+
+    per_user, extra = divmod(submissions, max(users, 1))
+    for start in range(0, users, batch_size):
+        with transaction.atomic():
+            user_rows = User.objects.bulk_create([
+                User(username=f'{USER_PREFIX}{i}', email=f'{USER_PREFIX}{i}@example.com', password=password)
+                for i in range(start, min(start + batch_size, users))
+            ])
+            totals = defaultdict(lambda: [0, 0])
+            solved_sets = defaultdict(SolvedSet)
+            submission_rows = []
+            solved_pairs = []
+            for user in user_rows:
+                index = int(user.username[len(USER_PREFIX):])
+                count = min(per_user + (1 if index < extra else 0), len(puzzle_ids))
+                offset = (index * 7919) % len(puzzle_ids) if puzzle_ids else 0
+                for j in range(count):
+                    puzzle_id = puzzle_ids[(offset + j) % len(puzzle_ids)]
+                    correct = rng.random() < 0.6
+                    mcq = puzzle_mcq[puzzle_id]
+                    submission_rows.append(Submission(
+                        user_id=user.pk, puzzle_id=puzzle_id, is_correct=correct, status='completed',
+                        answer=('A' if correct else 'B') if mcq else None,
+                        code=None if mcq else 'def solve():\n    return 42\n',
+                        feedback={} if mcq else {'is_valid': correct, 'message': 'Seeded'},
+                    ))
+                    if correct:
+                        totals[user.pk][0] += puzzle_points[puzzle_id]
+                        totals[user.pk][1] += 1
+                        solved_pairs.append((user.pk, puzzle_id))
+                        solved_sets[user.pk].add(puzzle_id)
+            profiles = UserProfile.objects.bulk_create([
+                UserProfile(user_id=user.pk, total_points=totals[user.pk][0], puzzles_solved=totals[user.pk][1],
+                            solved_bitmap=solved_sets[user.pk].to_bytes())
+                for user in user_rows
+            ])
+            profile_ids = {profile.user_id: profile.pk for profile in profiles}
+            Submission.objects.bulk_create(submission_rows, batch_size=batch_size)
+            UserProfile.solved_puzzles.through.objects.bulk_create([
+                UserProfile.solved_puzzles.through(userprofile_id=profile_ids[user_id], puzzle_id=puzzle_id)
+                for user_id, puzzle_id in solved_pairs
+            ], batch_size=batch_size)
+
+    # The admin user is created normally so its profile comes from the signal
+    User.objects.create_superuser(ADMIN_USERNAME, f'{ADMIN_USERNAME}@example.com', BENCH_PASSWORD)
+    ScoreBucket.rebuild()
+    stats.rebuild()
+    cache.clear()
+    return {'puzzles': puzzles, 'users': users, 'submissions': submissions}
+
+
+def build_scenarios():
+    """Return (name, username, method, path, data) for every benchmarked request."""
+    mcq = Puzzle.objects.filter(puzzle_type='mcq').order_by('pk').values_list('pk', flat=True).first()
+    code = Puzzle.objects.filter(puzzle_type='code').order_by('pk').values_list('pk', flat=True).first()
+    user = f'{USER_PREFIX}0'
+    scenarios = [
+        ('index', user, 'get', '/', None),
+        ('index_filtered', user, 'get', '/?category=PY&level=intermediate', None),
+        ('leaderboard', user, 'get', '/leaderboard/', None),
+        ('profile', user, 'get', '/profile/', None),
+        ('admin_dashboard', ADMIN_USERNAME, 'get', '/custom-admin/custom-dashboard/', None),
+        ('admin_users', ADMIN_USERNAME, 'get', '/custom-admin/manage-users/', None),
+        ('admin_puzzles', ADMIN_USERNAME, 'get', '/custom-admin/manage-puzzles/', None),
+        ('admin_generate', ADMIN_USERNAME, 'get', '/custom-admin/generate-puzzles/', None),
+    ]
+    if mcq:
+        scenarios += [
+            ('puzzle_detail', user, 'get', f'/puzzle/{mcq}/', None),
+            ('solve_mcq', user, 'post', f'/puzzle/{mcq}/solve/', {'answer': 'A'}),
+        ]
+    if code:
+        scenarios += [
+            ('solve_get', user, 'get', f'/puzzle/{code}/solve/', None),
+            ('solve_code', user, 'post', f'/puzzle/{code}/solve/', {'code': 'def solve():\n    return 42\n'}),
+        ]
+    return scenarios
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenarios(iterations=20, only=None):
+    """Time every scenario; solving uses the stub LLM and grades inline."""
+    results = {}
+    clients = {}
+    with override_settings(LLM={**getattr(settings, 'LLM', {}), 'BACKEND': 'stub', 'STUB_LATENCY': 0},
+                           PUZZLE_GRADING_INLINE=True):
+        llm.reset_client()
+        try:
+            for name, username, method, path, data in build_scenarios():
+                if only and name not in only:
+                    continue
+                if username not in clients:
+                    clients[username] = Client()
+                    clients[username].force_login(User.objects.get(username=username))
+                client = clients[username]
+                cache.clear()
+                timings = []
+                queries = 0
+                status = None
+                for _ in range(iterations):
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = getattr(client, method)(path, data) if data else getattr(client, method)(path)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries = max(queries, len(captured))
+                    status = response.status_code
+                timings.sort()
+                results[name] = {
+                    'status': status,
+                    'queries': queries,
+                    'p50_ms': round(percentile(timings, 0.50), 2),
+                    'p95_ms': round(percentile(timings, 0.95), 2),
+                    'p99_ms': round(percentile(timings, 0.99), 2),
+                    'mean_ms': round(sum(timings) / len(timings), 2),
+                }
+        finally:
+            llm.reset_client()
+    return results
+
+
+def _load_result(statuses, timings, elapsed):
+    timings.sort()
+    return {
+        'requests': len(statuses),
+        'statuses': dict(sorted(Counter(statuses).items())),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(statuses) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+
+
+def run_solve_load(requests=200, wsgi_threads=8, llm_latency=1.0):
+    """Compare WSGI and ASGI throughput for coding solves that wait on the LLM.
+
+    Every request submits distinct code (so the verdict cache never answers)
+    for a coding puzzle without test cases, graded inline by the stub LLM
+    sleeping ``llm_latency`` seconds. Returns {'wsgi': ..., 'asgi': ...}.
+    """
+    users = list(User.objects.filter(username__startswith=USER_PREFIX).order_by('pk'))
+    puzzle_ids = list(Puzzle.objects.filter(puzzle_type='code').order_by('pk').values_list('pk', flat=True))
+    if not users or not puzzle_ids:
+        raise ValueError("Seed users and coding puzzles first")
+
+    def make_requests(client_class, offset):
+        batch = []
+        for i in range(requests):
+            client = client_class()
+            client.force_login(users[i % len(users)])
+            path = f'/puzzle/{puzzle_ids[(i // len(users)) % len(puzzle_ids)]}/solve/'
+            batch.append((client, path, {'code': f'def solve():\n    return {offset + i}\n'}))
+        return batch
+
+    llm_settings = {**getattr(settings, 'LLM', {}), 'BACKEND': 'stub', 'STUB_LATENCY': llm_latency,
+                    'MAX_CONCURRENCY': max(wsgi_threads, 1), 'ASYNC_MAX_CONCURRENCY': max(requests, 1)}
+    results = {}
+    with override_settings(LLM=llm_settings, PUZZLE_GRADING_INLINE=True):
+        llm.reset_client()
+        try:
+            batch = make_requests(Client, 0)
+
+            def post(item):
+                client, path, data = item
+                started = time.perf_counter()
+                response = client.post(path, data)
+                return response.status_code, (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=wsgi_threads) as pool:
+                outcomes = list(pool.map(post, batch))
+            results['wsgi'] = _load_result([o[0] for o in outcomes], [o[1] for o in outcomes],
+                                           time.perf_counter() - started)
+
+            batch = make_requests(AsyncClient, requests)
+
+            async def apost(item):
+                client, path, data = item
+                started = time.perf_counter()
+                # Like ASGIHandler: each request gets its own thread for sync code
+                async with ThreadSensitiveContext():
+                    response = await client.post(path, data)
+                return response.status_code, (time.perf_counter() - started) * 1000
+
+            async def send_all():
+                return await asyncio.gather(*(apost(item) for item in batch))
+
+            started = time.perf_counter()
+            outcomes = asyncio.run(send_all())
+            results['asgi'] = _load_result([o[0] for o in outcomes], [o[1] for o in outcomes],
+                                           time.perf_counter() - started)
+        finally:
+            llm.reset_client()
+    return results
+
+
+def run_signups(count=50, first_name='John', last_name='Smith'):
+    """Sign up count people with the same name through the signup view."""
+    queries = []
+    timings = []
+    url = reverse('puzzle:signup')
+    for i in range(count):
+        data = {
+            'email': f'{SIGNUP_EMAIL_PREFIX}{i}@example.com',
+            'first_name': first_name,
+            'last_name': last_name,
+            'password1': BENCH_PASSWORD,
+            'password2': BENCH_PASSWORD,
+        }
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = Client().post(url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 302:
+            raise RuntimeError(f"Signup {i} failed with status {response.status_code}")
+        queries.append(len(captured))
+    usernames = User.objects.filter(email__startswith=SIGNUP_EMAIL_PREFIX).values_list('username', flat=True)
+    timings.sort()
+    return {
+        'signups': count,
+        'distinct_usernames': len(set(usernames)),
+        # The first signup for a name also starts its counter
+        'queries_first': queries[0],
+        'queries_min': min(queries[1:], default=queries[0]),
+        'queries_max': max(queries[1:], default=queries[0]),
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+    }
+
+
+def compare(results, baseline, latency_tolerance=None):
+    """Return a list of regressions of results against a baseline report."""
+    regressions = []
+    for name, expected in baseline.get('results', {}).items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        if actual['status'] != expected['status']:
+            regressions.append(f"{name}: status {actual['status']} (baseline {expected['status']})")
+        if actual['queries'] > expected['queries']:
+            regressions.append(f"{name}: {actual['queries']} queries (baseline {expected['queries']})")
+        if latency_tolerance and actual['p95_ms'] > expected['p95_ms'] * latency_tolerance:
+            regressions.append(
+                f"{name}: p95 {actual['p95_ms']}ms exceeds {latency_tolerance}x baseline {expected['p95_ms']}ms"
+            )
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_report(path, sizes, iterations, results):
+    report = {'sizes': sizes, 'iterations': iterations, 'results': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return report
@@ -0,0 +1,115 @@
+"""Puzzle index queries: lean, keyset-paginated and cached per filter."""
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Substr
+from django.utils.dateparse import parse_datetime
+
+from . import solved_set
+from .models import Puzzle
+from .utils import encode_cursor, decode_cursor
+
+PAGE_SIZE = 24
+SUMMARY_LENGTH = 100
+CACHE_TIMEOUT = 300
+VERSION_KEY = 'puzzle_index_version'
+
+# Only the columns the list renders; description is truncated in the database
+INDEX_FIELDS = ('id', 'title', 'category', 'level', 'puzzle_type', 'points', 'created_at')
+
+LEVEL_DISPLAY = dict(Puzzle.LEVEL_CHOICES)
+CATEGORY_DISPLAY = dict(Puzzle.CATEGORIES)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, None)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached index page (called when puzzles change)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def normalize_filters(category, level):
+    """Known category and level codes, with anything else read as 'all'.
+
+    Only these values reach the cache key, so query strings can't mint
+    unbounded keys. The level only applies within a category.
+    """
+    category = category if category in CATEGORY_DISPLAY else 'all'
+    level = level if category != 'all' and level in LEVEL_DISPLAY else 'all'
+    return category, level
+
+
+def parse_cursor(token):
+    """Return the (level, created_at, id) sort key encoded in an index cursor, or None."""
+    try:
+        level, created_at, puzzle_id = decode_cursor(token)
+        created_at = parse_datetime(created_at)
+        if created_at is None or level not in LEVEL_DISPLAY:
+            return None
+        return level, created_at, int(puzzle_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _fetch_rows(category, level, cursor):
+    puzzles = Puzzle.objects.all()
+    if category != 'all':
+        puzzles = puzzles.filter(category=category)
+        if level != 'all':
+            puzzles = puzzles.filter(level=level)
+    if cursor is not None:
+        after_level, after_created, after_id = cursor
+        # Keyset continuation of the model ordering (level, -created_at), with id as tie-breaker
+        puzzles = puzzles.filter(
+            Q(level__gt=after_level)
+            | Q(level=after_level, created_at__lt=after_created)
+            | Q(level=after_level, created_at=after_created, id__lt=after_id)
+        )
+    return list(
+        puzzles.order_by('level', '-created_at', '-id')
+        .annotate(summary=Substr('description', 1, SUMMARY_LENGTH + 1))
+        .values(*INDEX_FIELDS, 'summary')[:PAGE_SIZE + 1]
+    )
+
+
+def get_index_page(category, level, cursor_token, profile):
+    """Return a page of puzzle rows plus the cursor of the next page.
+
+    Rows are cached per filter and cursor, shared by all users; the solved
+    flag comes from the profile's solved bitmap.
+    """
+    category, level = normalize_filters(category, level)
+    cursor = parse_cursor(cursor_token)
+    # Built from the parsed cursor, not the token, so the key stays short and memcached-safe
+    after = f'{cursor[0]}:{cursor[1].isoformat()}:{cursor[2]}' if cursor else ''
+    key = f'puzzle_index:{get_version()}:{category}:{level}:{after}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = _fetch_rows(category, level, cursor)
+        cache.set(key, rows, CACHE_TIMEOUT)
+    solved = solved_set.for_profile(profile)
+
+    next_cursor = None
+    if len(rows) > PAGE_SIZE:
+        rows = rows[:PAGE_SIZE]
+        last = rows[-1]
+        next_cursor = encode_cursor([last['level'], last['created_at'].isoformat(), last['id']])
+
+    puzzles = []
+    for row in rows:
+        puzzles.append(dict(
+            row,
+            is_solved=row['id'] in solved,
+            level_display=LEVEL_DISPLAY.get(row['level'], row['level']),
+            category_display=CATEGORY_DISPLAY.get(row['category'], row['category']),
+            type_display='MCQ' if row['puzzle_type'] == 'mcq' else 'Coding',
+        ))
+    return puzzles, next_cursor
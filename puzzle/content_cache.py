@@ -0,0 +1,155 @@
+"""Versioned two-tier cache of puzzle content for the detail and solve pages.
+
+A puzzle's entry (its field values plus the MCQ choices and rendered
+description derived from them) lives in the shared Django cache under a key
+containing the puzzle's current version, with an in-process LRU in front.
+Puzzle saves and deletes bump the version, so stale entries are never read
+again and simply expire. Each process trusts its copy of a version for
+VERSION_TTL seconds before re-reading it from the shared cache.
+"""
+import copy
+import threading
+import time
+
+from cachetools import LRUCache, TTLCache
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.html import linebreaks
+from django.utils.safestring import mark_safe
+
+from .models import Puzzle
+
+DEFAULTS = {
+    'LOCAL_SIZE': 512,   # entries kept in each process
+    'TIMEOUT': 3600,     # seconds an entry lives in the shared cache
+    'VERSION_TTL': 2,    # seconds a process reuses a version before re-checking it
+}
+
+FIELDS = [field.attname for field in Puzzle._meta.concrete_fields]
+TEST_CASES_INDEX = FIELDS.index('test_cases')
+
+
+def get_settings():
+    return {**DEFAULTS, **getattr(settings, 'PUZZLE_CACHE', {})}
+
+
+_lock = threading.Lock()
+_caches = None
+
+
+def _get_caches():
+    """The in-process entry and version caches, sized from the settings on first use."""
+    global _caches
+    if _caches is None:
+        with _lock:
+            if _caches is None:
+                options = get_settings()
+                _caches = (LRUCache(maxsize=options['LOCAL_SIZE']),
+                           TTLCache(maxsize=options['LOCAL_SIZE'], ttl=options['VERSION_TTL']))
+    return _caches
+
+
+def version_key(puzzle_id):
+    return f'puzzle_content:{puzzle_id}:version'
+
+
+def get_version(puzzle_id):
+    _, versions = _get_caches()
+    with _lock:
+        version = versions.get(puzzle_id)
+    if version is None:
+        key = version_key(puzzle_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        with _lock:
+            versions[puzzle_id] = version
+    return version
+
+
+def bump_version(puzzle_id):
+    """Make every cached copy of a puzzle unreachable (called when it changes)."""
+    # A fresh token rather than incr(): if the version key was evicted, an old
+    # counter value could otherwise come back and revive a stale entry
+    version = time.time_ns()
+    cache.set(version_key(puzzle_id), version, None)
+    _, local_versions = _get_caches()
+    with _lock:
+        local_versions[puzzle_id] = version
+
+
+def bump_versions(puzzle_ids):
+    """bump_version() for many puzzles in one round trip to the shared cache."""
+    versions = {puzzle_id: time.time_ns() for puzzle_id in puzzle_ids}
+    cache.set_many({version_key(puzzle_id): version for puzzle_id, version in versions.items()}, None)
+    _, local_versions = _get_caches()
+    with _lock:
+        local_versions.update(versions)
+
+
+def clear_local():
+    """Drop this process's copies; the caches are rebuilt from the current settings on next use."""
+    global _caches
+    with _lock:
+        _caches = None
+
+
+def _build_entry(values):
+    data = dict(zip(FIELDS, values))
+    test_cases = data['test_cases']
+    choices = []
+    if data['puzzle_type'] == 'mcq' and isinstance(test_cases, dict):
+        choices = [(key, value) for key, value in test_cases.items()]
+    return {
+        'values': tuple(values),
+        'choices': choices,
+        'description_html': linebreaks(data['description'] or '', autoescape=True),
+    }
+
+
+def get_entry(puzzle_id):
+    """Return the cached content of a puzzle, loading it on a miss; None if it doesn't exist."""
+    version = get_version(puzzle_id)
+    local_key = (puzzle_id, version)
+    local, _ = _get_caches()
+    with _lock:
+        entry = local.get(local_key)
+    if entry is None:
+        shared_key = f'puzzle_content:{puzzle_id}:{version}'
+        entry = cache.get(shared_key)
+        if entry is None:
+            values = Puzzle.objects.filter(pk=puzzle_id).values_list(*FIELDS).first()
+            if values is None:
+                return None
+            entry = _build_entry(values)
+            cache.set(shared_key, entry, get_settings()['TIMEOUT'])
+        with _lock:
+            local[local_key] = entry
+    return entry
+
+
+def get_puzzle(puzzle_id):
+    """Return a fresh Puzzle instance built from the cache, or None.
+
+    The instance also carries the precomputed ``mcq_choices`` and
+    ``description_html``.
+    """
+    entry = get_entry(puzzle_id)
+    if entry is None:
+        return None
+    values = list(entry['values'])
+    # Entries are shared between requests; give each instance its own copy of the JSON
+    values[TEST_CASES_INDEX] = copy.deepcopy(values[TEST_CASES_INDEX])
+    puzzle = Puzzle.from_db(Puzzle.objects.db, FIELDS, values)
+    puzzle.mcq_choices = entry['choices']
+    puzzle.description_html = mark_safe(entry['description_html'])
+    return puzzle
+
+
+def get_puzzle_or_404(puzzle_id):
+    puzzle = get_puzzle(puzzle_id)
+    if puzzle is None:
+        raise Http404("No Puzzle matches the given query.")
+    return puzzle
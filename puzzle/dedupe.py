@@ -0,0 +1,128 @@
+"""Exact and near-duplicate detection for new puzzles.
+
+Exact repeats are found through the unique ``Puzzle.title_hash`` index and
+near duplicates through the SimilarityBucket LSH index (see puzzle.minhash):
+candidates are the puzzles sharing a band bucket, confirmed by comparing
+signatures. Both lookups are batched over the puzzles being checked, so
+generation and import never load the whole table.
+"""
+from django.conf import settings
+from django.db import connection
+
+from . import minhash
+from .models import Puzzle, SimilarityBucket
+
+DEFAULTS = {
+    'THRESHOLD': 0.5,        # estimated Jaccard similarity that counts as a near duplicate
+    'MAX_CANDIDATES': 200,   # stored candidates compared per checked puzzle
+}
+
+# Parameters per IN (...) query, under SQLite's limit
+QUERY_CHUNK = 900
+
+
+def get_settings():
+    return {**DEFAULTS, **getattr(settings, 'PUZZLE_DEDUPE', {})}
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), QUERY_CHUNK):
+        yield values[start:start + QUERY_CHUNK]
+
+
+def find_duplicates(puzzles, near=True):
+    """Check unsaved, fingerprinted puzzles against the table and against each other.
+
+    Returns {index: (reason, other)} for the puzzles to drop, where reason is
+    'exact' or 'near' and other is the stored puzzle's pk, or None when the
+    match is an earlier puzzle in the list. A stored puzzle with the same uid
+    is the row being updated, not a duplicate.
+    """
+    options = get_settings()
+    stored_titles = {}
+    for chunk in _chunks({puzzle.title_hash for puzzle in puzzles if puzzle.title_hash}):
+        stored_titles.update(
+            (title_hash, (pk, uid))
+            for title_hash, pk, uid in Puzzle.objects.filter(title_hash__in=chunk).values_list('title_hash', 'pk', 'uid')
+        )
+
+    signatures = {}
+    buckets = {}
+    stored_buckets = {}
+    stored_signatures = {}
+    if near:
+        for index, puzzle in enumerate(puzzles):
+            signature = minhash.unpack(puzzle.signature)
+            if signature:
+                signatures[index] = signature
+                buckets[index] = minhash.band_buckets(signature)
+        for chunk in _chunks({bucket for values in buckets.values() for bucket in values}):
+            for puzzle_id, bucket in SimilarityBucket.objects.filter(bucket__in=chunk).values_list('puzzle_id', 'bucket'):
+                stored_buckets.setdefault(bucket, set()).add(puzzle_id)
+        for chunk in _chunks(set().union(*stored_buckets.values())):
+            for pk, uid, signature in Puzzle.objects.filter(pk__in=chunk).values_list('pk', 'uid', 'signature'):
+                stored_signatures[pk] = (uid, minhash.unpack(signature))
+
+    duplicates = {}
+    seen_titles = set()
+    seen_buckets = {}
+    for index, puzzle in enumerate(puzzles):
+        if puzzle.title_hash:
+            stored = stored_titles.get(puzzle.title_hash)
+            if stored and stored[1] != puzzle.uid:
+                duplicates[index] = ('exact', stored[0])
+                continue
+            if puzzle.title_hash in seen_titles:
+                duplicates[index] = ('exact', None)
+                continue
+        signature = signatures.get(index)
+        if signature:
+            match = _near_match(puzzle, signature, buckets[index], stored_buckets, stored_signatures,
+                                seen_buckets, signatures, options)
+            if match:
+                duplicates[index] = match
+                continue
+        if puzzle.title_hash:
+            seen_titles.add(puzzle.title_hash)
+        for bucket in buckets.get(index, ()):
+            seen_buckets.setdefault(bucket, []).append(index)
+    return duplicates
+
+
+def _near_match(puzzle, signature, buckets, stored_buckets, stored_signatures, seen_buckets, signatures, options):
+    threshold = options['THRESHOLD']
+    candidates = set()
+    for bucket in buckets:
+        candidates.update(stored_buckets.get(bucket, ()))
+    for pk in sorted(candidates)[:options['MAX_CANDIDATES']]:
+        uid, other = stored_signatures.get(pk, (None, None))
+        if other and uid != puzzle.uid and minhash.similarity(signature, other) >= threshold:
+            return ('near', pk)
+    earlier = {index for bucket in buckets for index in seen_buckets.get(bucket, ())}
+    for index in earlier:
+        if minhash.similarity(signature, signatures[index]) >= threshold:
+            return ('near', None)
+    return None
+
+
+def index_puzzles(puzzles, replace=False):
+    """Write the LSH buckets of saved puzzles, replacing their old ones if replace is set."""
+    if replace:
+        for chunk in _chunks(puzzle.pk for puzzle in puzzles):
+            SimilarityBucket.objects.filter(puzzle__in=chunk).delete()
+    rows = []
+    for puzzle in puzzles:
+        signature = minhash.unpack(puzzle.signature)
+        if signature:
+            rows.extend((puzzle.pk, bucket) for bucket in minhash.band_buckets(signature))
+    if rows:
+        # Sixteen rows per puzzle: a plain executemany skips bulk_create's per-object
+        # model and field handling, which costs several times the insert itself
+        meta = SimilarityBucket._meta
+        sql = (f"INSERT INTO {connection.ops.quote_name(meta.db_table)} "
+               f"({connection.ops.quote_name(meta.get_field('puzzle').column)}, "
+               f"{connection.ops.quote_name(meta.get_field('bucket').column)}) VALUES (%s, %s)")
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+    return len(rows)
@@ -0,0 +1,70 @@
+"""Per-user, per-puzzle code drafts for the solve page.
+
+The code a user last submitted for a coding puzzle is kept zlib-compressed
+in the CodeDraft table rather than in the session, so sessions stay small and
+a draft is only read when its solve page is. The shared Django cache sits in
+front as the hot tier; it is shared rather than per-process because drafts
+change on every submission and the redirect after one may land on another
+worker. LocMemCache evicts least recently used entries when full, and a
+Redis cache should run with ``maxmemory-policy allkeys-lru``.
+"""
+import logging
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import CodeDraft
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_BYTES': 32 * 1024,   # largest compressed draft kept
+    'TIMEOUT': 3600,          # seconds a draft stays in the hot tier
+}
+
+
+def get_settings():
+    return {**DEFAULTS, **getattr(settings, 'PUZZLE_DRAFTS', {})}
+
+
+def cache_key(user_id, puzzle_id):
+    return f'code_draft:{user_id}:{puzzle_id}'
+
+
+def compress(code):
+    return zlib.compress(code.encode(), 6)
+
+
+def decompress(data):
+    return zlib.decompress(bytes(data)).decode() if data else ''
+
+
+def load(user_id, puzzle_id):
+    """The user's draft for a puzzle, or '' if there is none."""
+    key = cache_key(user_id, puzzle_id)
+    data = cache.get(key)
+    if data is None:
+        data = (CodeDraft.objects.filter(user_id=user_id, puzzle_id=puzzle_id)
+                .values_list('data', flat=True).first())
+        # Cache misses too, as b'', so a puzzle without a draft doesn't query every time
+        data = bytes(data) if data is not None else b''
+        cache.set(key, data, get_settings()['TIMEOUT'])
+    return decompress(data)
+
+
+def save(user_id, puzzle_id, code):
+    """Store a draft; returns False (keeping any older draft) if it is over the size cap."""
+    options = get_settings()
+    data = compress(code)
+    if len(data) > options['MAX_BYTES']:
+        logger.info(f"Draft for puzzle {puzzle_id} by user {user_id} is {len(data)} bytes compressed; not kept")
+        return False
+    # INSERT ... ON CONFLICT (user, puzzle) DO UPDATE: one statement whether or not a draft exists
+    CodeDraft.objects.bulk_create(
+        [CodeDraft(user_id=user_id, puzzle_id=puzzle_id, data=data)],
+        update_conflicts=True, unique_fields=['user', 'puzzle'], update_fields=['data', 'updated_at'],
+    )
+    cache.set(cache_key(user_id, puzzle_id), data, options['TIMEOUT'])
+    return True
+
@@ -1,8 +1,10 @@
 from django import forms
-from .models import Submission, Puzzle
+from django.db import IntegrityError, transaction
+from .models import Submission, Puzzle, UsernameCounter
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from .auth_backends import email_matches
 
 class PuzzleSubmissionForm(forms.ModelForm):
     code = forms.CharField(
@@ -31,9 +33,12 @@ class PuzzleSubmissionForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if self.puzzle:
             if self.puzzle.puzzle_type == 'mcq':
-                # Use test_cases for MCQ choices
+                # Use test_cases for MCQ choices (precomputed when the puzzle came from the content cache)
+                choices = getattr(self.puzzle, 'mcq_choices', None)
+                if choices is None:
+                    choices = [(k, v) for k, v in self.puzzle.test_cases.items()]
                 self.fields['answer'].widget = forms.Select(
-                    choices=[('', 'Select an option')] + [(k, v) for k, v in self.puzzle.test_cases.items()],
+                    choices=[('', 'Select an option')] + choices,
                     attrs={'class': 'form-control mb-3'}
                 )
                 self.fields['code'].widget = forms.HiddenInput()
@@ -84,26 +89,32 @@ class SignUpForm(UserCreationForm):
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        if email_matches(email).exists():
             raise ValidationError("Email already exists")
         return email
 
+    # Allocated usernames tried before giving up on a signup
+    USERNAME_ATTEMPTS = 5
+
     def save(self, commit=True):
         user = super().save(commit=False)
         base_username = f"{self.cleaned_data['first_name'].lower()}.{self.cleaned_data['last_name'].lower()}"
-        username = base_username
-        counter = 1
-        
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-            
-        user.username = username
+        user.username = UsernameCounter.allocate(base_username)
         if commit:
-            user.save()
+            for attempt in range(1, self.USERNAME_ATTEMPTS + 1):
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    break
+                except IntegrityError:
+                    # Taken without going through the counter (e.g. by the admin); try the next one
+                    if attempt == self.USERNAME_ATTEMPTS:
+                        raise
+                    user.username = UsernameCounter.allocate(base_username)
         return user
 
 class EmailAuthenticationForm(AuthenticationForm):
+    """Login form; EmailOrUsernameBackend resolves the name as a username or an email."""
     username = forms.CharField(
         label='Email or Username',
         widget=forms.TextInput(attrs={
@@ -117,13 +128,3 @@ class EmailAuthenticationForm(AuthenticationForm):
             'placeholder': 'Enter password'
         })
     )
-
-    def clean_username(self):
-        username = self.cleaned_data.get('username')
-        if '@' in username:
-            try:
-                user = User.objects.get(email=username)
-                return user.username
-            except User.DoesNotExist:
-                raise ValidationError("Invalid email address")
-        return username
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""Admin puzzle generation as a chunked background job.
+
+A GenerationJob is split into chunks of CHUNK_SIZE puzzles, one LLM prompt
+each. Chunks run concurrently on a bounded thread pool; the job thread drops
+exact and near duplicates through the indexed lookups in puzzle.dedupe and
+inserts each finished chunk with bulk_create, recording per-chunk state on the
+job so a retry only reruns the chunks that failed.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from . import catalog, dedupe, llm
+from .models import GenerationJob, Puzzle, SiteStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CHUNK_SIZE': 5,      # puzzles requested per prompt
+    'WORKERS': 4,         # chunks generated concurrently
+    'MAX_ATTEMPTS': 3,    # prompts per chunk before it is marked failed
+    'MAX_PUZZLES': 100,   # largest batch the admin form accepts
+    'STALE_AFTER': 600,   # seconds before a silent running job may be retried
+}
+
+AVOID_TITLES = 50
+POINTS = {'beginner': 10, 'intermediate': 20, 'expert': 30}
+
+
+def get_settings():
+    return {**DEFAULTS, **getattr(settings, 'PUZZLE_GENERATION', {})}
+
+
+def build_prompt(cat_name, level, count, batch, batches, avoid_titles):
+    if level == 'beginner':
+        prompt = f"""Return JSON only. Generate {count} unique MCQs for {cat_name}.
+        Each question MUST have a detailed description.
+        Format: [{{"title": "short question", "description": "detailed explanation of the question",
+        "options": {{"A": "option1", "B": "option2", "C": "option3", "D": "option4"}},
+        "correct_answer": "A/B/C/D"}}]"""
+    else:
+        prompt = f"""Return JSON only. Generate {count} unique {level} {cat_name} coding puzzles.
+        Each puzzle MUST have a detailed description.
+        Format: [{{"title": "short name", "description": "detailed problem statement with requirements",
+        "test_cases": {{"test1": {{"input": "example", "output": "result"}},
+        "test2": {{"input": "example2", "output": "result2"}}}}}}]"""
+    if batches > 1:
+        # Chunks are prompted in parallel, so steer each one towards different ground
+        prompt += f"\nThis is batch {batch} of {batches}; cover topics the other batches are unlikely to pick."
+    if avoid_titles:
+        prompt += "\nDo not reuse any of these titles: " + json.dumps(avoid_titles)
+    return prompt
+
+
+def parse_puzzles(text):
+    """Extract the list of puzzle dicts from an LLM response."""
+    data = llm.extract_json(text)
+    if not isinstance(data, list):
+        data = [data]
+    return [item for item in data if isinstance(item, dict)]
+
+
+def generate_chunk(cat_name, level, count, batch, batches, avoid_titles, max_attempts):
+    """Prompt the LLM for one chunk, retrying malformed responses. Runs on a pool thread."""
+    prompt = build_prompt(cat_name, level, count, batch, batches, avoid_titles)
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return parse_puzzles(llm.generate(prompt, purpose='generation'))
+        except (json.JSONDecodeError, ValueError) as e:
+            if attempt == max_attempts:
+                raise ValueError(f"No valid JSON after {max_attempts} attempts: {e}")
+            logger.warning(f"Chunk {batch} returned invalid JSON (attempt {attempt}): {e}")
+
+
+def build_puzzles(job, items, limit):
+    """Turn parsed items into unsaved Puzzle rows, skipping invalid items and duplicates."""
+    puzzles = []
+    for item in items:
+        title = str(item.get('title', '')).strip()[:200]
+        description = str(item.get('description', '')).strip()
+        if not title or not description:
+            continue
+        beginner = job.level == 'beginner'
+        puzzle = Puzzle(
+            title=title,
+            description=description,
+            category=job.category,
+            level=job.level,
+            # bulk_create skips Puzzle.save, so set what it would derive
+            puzzle_type='mcq' if beginner else 'code',
+            points=POINTS.get(job.level, 10),
+            test_cases=item.get('options', {}) if beginner else item.get('test_cases', {}),
+            solution=item.get('correct_answer', '') if beginner else '',
+        )
+        puzzle.set_fingerprint()
+        puzzles.append(puzzle)
+    duplicates = dedupe.find_duplicates(puzzles)
+    if duplicates:
+        logger.info(f"Generation job {job.pk} skipped {len(duplicates)} duplicate puzzle(s)")
+    return [puzzle for index, puzzle in enumerate(puzzles) if index not in duplicates][:limit]
+
+
+def _insert_one(puzzle):
+    try:
+        with transaction.atomic():
+            Puzzle.objects.bulk_create([puzzle])
+    except IntegrityError:
+        return False
+    return True
+
+
+def insert_puzzles(job, puzzles):
+    """bulk_create a chunk and apply what the skipped post_save receivers would have done."""
+    if not puzzles:
+        return 0
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Puzzle.objects.bulk_create(puzzles)
+        except IntegrityError:
+            # Another job stored one of these titles since the check; keep the rest
+            puzzles = [puzzle for puzzle in puzzles if _insert_one(puzzle)]
+            if not puzzles:
+                return 0
+        dedupe.index_puzzles(puzzles)
+        deltas = {'total_puzzles': len(puzzles)}
+        level_field = SiteStats.LEVEL_FIELDS.get(job.level)
+        if level_field:
+            deltas[level_field] = len(puzzles)
+        SiteStats.increment(**deltas)
+    catalog.bump_version()
+    return len(puzzles)
+
+
+def create_job(category, level, requested, user=None):
+    """Create a job with its chunk plan; call start_job to run it."""
+    chunk_size = get_settings()['CHUNK_SIZE']
+    chunks = [
+        {'index': index, 'size': min(chunk_size, requested - start),
+         'status': 'pending', 'created': 0, 'attempts': 0, 'error': ''}
+        for index, start in enumerate(range(0, requested, chunk_size))
+    ]
+    return GenerationJob.objects.create(
+        category=category, level=level, requested=requested, chunks=chunks, created_by=user
+    )
+
+
+def _save_progress(job, *fields):
+    job.created_count = sum(chunk['created'] for chunk in job.chunks)
+    job.save(update_fields=['chunks', 'created_count', 'updated_at', *fields])
+
+
+def run_job(job_id):
+    """Generate every chunk of a job that has not finished yet."""
+    job = GenerationJob.objects.get(pk=job_id)
+    options = get_settings()
+    todo = [chunk for chunk in job.chunks if chunk['status'] != 'done']
+    for chunk in todo:
+        chunk.update(status='running', error='')
+    job.status = 'running'
+    job.error = ''
+    job.finished_at = None
+    _save_progress(job, 'status', 'error', 'finished_at')
+
+    cat_name = dict(Puzzle.CATEGORIES).get(job.category, 'Python')
+    recent_titles = list(Puzzle.objects.filter(category=job.category, level=job.level)
+                         .order_by('-created_at').values_list('title', flat=True)[:AVOID_TITLES])
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(options['WORKERS'], len(todo))),
+                                thread_name_prefix=f'generation-{job.pk}') as pool:
+            futures = {
+                pool.submit(generate_chunk, cat_name, job.level, chunk['size'], chunk['index'] + 1,
+                            len(job.chunks), recent_titles, options['MAX_ATTEMPTS']): chunk
+                for chunk in todo
+            }
+            # Only this thread touches the database; pool threads just talk to the LLM
+            for future in as_completed(futures):
+                chunk = futures[future]
+                chunk['attempts'] += 1
+                try:
+                    puzzles = build_puzzles(job, future.result(), chunk['size'])
+                    chunk['created'] = insert_puzzles(job, puzzles)
+                    chunk['status'] = 'done'
+                except Exception as e:
+                    logger.error(f"Generation job {job.pk} chunk {chunk['index']} failed: {str(e)}")
+                    chunk.update(status='failed', error=str(e))
+                _save_progress(job)
+    except Exception as e:
+        logger.error(f"Generation job {job.pk} failed: {str(e)}")
+        job.error = str(e)
+        for chunk in job.chunks:
+            if chunk['status'] == 'running':
+                chunk.update(status='failed', error=str(e))
+
+    job.status = 'failed' if job.failed_chunks else 'completed'
+    job.finished_at = timezone.now()
+    _save_progress(job, 'status', 'error', 'finished_at')
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    except Exception as e:
+        logger.error(f"Generation job {job_id} crashed: {str(e)}")
+    finally:
+        # close_old_connections() keeps a connection younger than CONN_MAX_AGE open,
+        # and nothing would ever reuse or close this thread's
+        connections.close_all()
+
+
+def start_job(job):
+    """Run a job on a background thread so the admin request returns immediately."""
+    thread = threading.Thread(target=_run_in_thread, args=(job.pk,),
+                              name=f'generation-job-{job.pk}', daemon=True)
+    thread.start()
+    return thread
+
+
+def retry_job(job):
+    """Rerun the unfinished chunks of a failed (or abandoned) job; False if it is still running."""
+    stale_before = timezone.now() - timedelta(seconds=get_settings()['STALE_AFTER'])
+    claimed = GenerationJob.objects.filter(pk=job.pk).filter(
+        status__in=['failed', 'pending']
+    ).update(status='running', updated_at=timezone.now())
+    if not claimed:
+        # A job whose thread died with the server stops updating; allow taking it over
+        claimed = GenerationJob.objects.filter(
+            pk=job.pk, status='running', updated_at__lt=stale_before
+        ).update(updated_at=timezone.now())
+    if not claimed:
+        return False
+    start_job(job)
+    return True
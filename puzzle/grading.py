@@ -0,0 +1,292 @@
+"""Grading of puzzle submissions and the DB-backed grading queue.
+
+Coding submissions are saved as ``pending`` and picked up by the
+``grade_submissions`` management command, which claims them one at a time
+using Submission.status as the queue state. When PUZZLE_GRADING_INLINE is
+set, the solve view grades in the request instead, through the async
+agrade_submission so the LLM wait doesn't hold a worker thread. The solve
+page's feedback stream (puzzle/streaming.py) claims a fresh submission
+itself and relays the validator's output as it arrives; the worker leaves
+submissions alone for STREAM_CLAIM_GRACE seconds to give it the chance.
+"""
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import llm, sandbox, solved_set, stats
+from .models import Attempt, ScoreBucket, Submission, UserProfile
+from .verdict_cache import verdict_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a new coding submission is reserved for the solve page's feedback stream
+STREAM_CLAIM_GRACE = 5
+
+
+def get_claim_grace():
+    return getattr(settings, 'PUZZLE_STREAM_CLAIM_GRACE', STREAM_CLAIM_GRACE)
+
+
+def validation_prompt(puzzle, user_code):
+    return f"""
+        Validate this Python code solution against the problem description. Respond ONLY with a JSON object.
+        Problem: {puzzle.description}
+
+        Code:
+        ```python
+        {user_code}
+        ```
+
+        Return a JSON object with these fields:
+        - is_valid: boolean
+        - message: string (explanation)
+        - errors: array of strings (if any)
+    """
+
+
+def check_validation(validation_result):
+    if not isinstance(validation_result, dict):
+        raise ValueError("Validation result is not a dictionary")
+    if 'is_valid' not in validation_result or 'message' not in validation_result:
+        raise ValueError("Missing required fields in validation result")
+    validation_result['engine'] = 'llm'
+    return validation_result
+
+
+def validate_with_llm(puzzle, user_code):
+    """Ask Gemini to validate a solution for a puzzle that has no runnable test cases."""
+    response = llm.generate(validation_prompt(puzzle, user_code), purpose='validation')
+    return check_validation(llm.extract_json(response))
+
+
+async def avalidate_with_llm(puzzle, user_code, on_token=None):
+    """Async validation; with ``on_token`` the response is streamed and each chunk passed to it."""
+    prompt = validation_prompt(puzzle, user_code)
+    if on_token is None:
+        response = await llm.agenerate(prompt, purpose='validation')
+    else:
+        chunks = []
+        async for chunk in llm.astream(prompt, purpose='validation'):
+            chunks.append(chunk)
+            on_token(chunk)
+        response = ''.join(chunks)
+    return check_validation(llm.extract_json(response))
+
+
+def validate_code(puzzle, user_code):
+    """Return a verdict dict for a coding submission."""
+    if sandbox.has_test_cases(puzzle.test_cases) and sandbox.available():
+        # Run the stored input/output pairs locally; no LLM round-trip needed
+        return sandbox.grade(user_code, puzzle.test_cases)
+    # Identical (or reformatted) resubmissions reuse the earlier LLM verdict
+    return verdict_cache.get_or_validate(puzzle, user_code, validate_with_llm)
+
+
+async def avalidate_code(puzzle, user_code, on_token=None):
+    if sandbox.has_test_cases(puzzle.test_cases) and await sync_to_async(sandbox.available, thread_sensitive=False)():
+        # The sandbox is thread-safe; don't queue behind the request's ORM thread
+        return await sync_to_async(sandbox.grade, thread_sensitive=False)(user_code, puzzle.test_cases)
+
+    async def validate(puzzle, user_code):
+        return await avalidate_with_llm(puzzle, user_code, on_token)
+
+    return await verdict_cache.aget_or_validate(puzzle, user_code, validate)
+
+
+def record_solve(user, puzzle):
+    """Award points for a puzzle the user has not solved before. Returns True if awarded.
+
+    The solved_puzzles row doubles as the idempotency guard: its unique
+    (userprofile, puzzle) constraint lets only one concurrent solve insert it,
+    and the counters and solved bitmap are updated in the same transaction.
+    """
+    user_profile = user.userprofile
+    with transaction.atomic():
+        _, created = UserProfile.solved_puzzles.through.objects.get_or_create(
+            userprofile_id=user_profile.pk, puzzle_id=puzzle.pk
+        )
+        if not created:
+            return False
+        profiles = UserProfile.objects.filter(pk=user_profile.pk)
+        profiles.update(
+            total_points=F('total_points') + puzzle.points,
+            puzzles_solved=F('puzzles_solved') + 1,
+        )
+        # We hold the row lock now, so the stored total is exactly ours
+        total_points, puzzles_solved, solved_bitmap = profiles.values_list(
+            'total_points', 'puzzles_solved', 'solved_bitmap'
+        ).get()
+        solved_bitmap = solved_set.add_locked(user_profile.pk, puzzle.pk, solved_bitmap)
+        ScoreBucket.move(total_points - puzzle.points, total_points)
+        stats.record_solve(user.pk)
+
+    user_profile.total_points = total_points
+    user_profile.puzzles_solved = puzzles_solved
+    user_profile.solved_bitmap = solved_bitmap
+    return True
+
+
+def log_attempt(submission, latency_ms=None):
+    """Append the outcome of a graded submission to the attempt log."""
+    verdict = submission.feedback or None
+    if submission.puzzle.puzzle_type == 'mcq':
+        engine = 'mcq'
+    else:
+        engine = (verdict or {}).get('engine', '')
+    return Attempt.objects.create(
+        user_id=submission.user_id,
+        puzzle_id=submission.puzzle_id,
+        answer=submission.answer,
+        code=submission.code,
+        is_correct=submission.is_correct,
+        status=submission.status,
+        verdict=verdict,
+        engine=engine,
+        latency_ms=latency_ms,
+    )
+
+
+def enqueue_submission(submission):
+    """Queue a coding submission for the grading worker.
+
+    A resubmission only writes the code and queue fields, so it can't clobber
+    a verdict being saved meanwhile; a new queued_at also makes any grade still
+    in flight for the old code a no-op (see record_grade).
+    """
+    submission.status = 'pending'
+    submission.queued_at = timezone.now()
+    submission.started_at = None
+    submission.feedback = None
+    if submission.pk is None:
+        submission.save()
+    else:
+        submission.save(update_fields=['code', 'status', 'queued_at', 'started_at', 'feedback'])
+
+
+def claim_next_submission():
+    """Atomically claim the oldest pending submission, or return None if the queue is empty.
+
+    Claiming is a compare-and-set on status, so several workers can poll the
+    same queue without grading a submission twice.
+    """
+    while True:
+        # Fresh submissions are left to the solve page's feedback stream for a moment
+        reserved_after = timezone.now() - timedelta(seconds=get_claim_grace())
+        candidate = (Submission.objects.filter(status='pending', queued_at__lte=reserved_after)
+                     .order_by('queued_at')
+                     .values_list('pk', flat=True)
+                     .first())
+        if candidate is None:
+            return None
+        claimed = Submission.objects.filter(pk=candidate, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            return Submission.objects.select_related('puzzle', 'user__userprofile').get(pk=candidate)
+
+
+def validation_error_message(submission, error):
+    """Log a failed validation and return the message shown to the user."""
+    if isinstance(error, json.JSONDecodeError):
+        logger.error(f"JSON parsing error for submission {submission.pk}: {str(error)}")
+        return "Invalid response format from validation service."
+    if isinstance(error, llm.LLMTimeout):
+        logger.error(f"Validation timed out for submission {submission.pk}: {str(error)}")
+        return "The validation service timed out. Please try again."
+    logger.error(f"Validation error for submission {submission.pk}: {str(error)}", exc_info=error)
+    return "An error occurred during validation. Please try again."
+
+
+def claim_user_submission(user, puzzle_id):
+    """Claim the user's pending submission for a puzzle, or return None if there is none to claim."""
+    claimed = Submission.objects.filter(user=user, puzzle_id=puzzle_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    return Submission.objects.select_related('puzzle', 'user__userprofile').get(user=user, puzzle_id=puzzle_id)
+
+
+def grade_submission(submission):
+    """Grade a claimed coding submission and record the outcome."""
+    started = time.perf_counter()
+    error_message = None
+    try:
+        validation_result = validate_code(submission.puzzle, submission.code or '')
+        logger.debug(f"Validation result for submission {submission.pk}: {validation_result}")
+    except Exception as e:
+        validation_result = None
+        error_message = validation_error_message(submission, e)
+    return record_grade(submission, validation_result, error_message, started)
+
+
+async def agrade_submission(submission, on_token=None):
+    """Async version of grade_submission(); ORM work runs in the request's sync thread.
+
+    ``on_token`` receives the LLM validator's output chunk by chunk as it streams.
+    """
+    started = time.perf_counter()
+    error_message = None
+    try:
+        validation_result = await avalidate_code(submission.puzzle, submission.code or '', on_token)
+        logger.debug(f"Validation result for submission {submission.pk}: {validation_result}")
+    except Exception as e:
+        validation_result = None
+        error_message = validation_error_message(submission, e)
+    return await sync_to_async(record_grade)(submission, validation_result, error_message, started)
+
+
+def record_grade(submission, validation_result, error_message, started):
+    """Save a submission's verdict, log the attempt and award points if it is correct.
+
+    The verdict is only written while the submission is still the claimed run:
+    if the user resubmitted (or the run was re-queued as stale) during grading,
+    it belongs to code that is no longer current and is dropped.
+    """
+    if validation_result is None:
+        submission.status = 'error'
+        submission.feedback = {'is_valid': False, 'message': error_message, 'errors': []}
+    else:
+        submission.is_correct = bool(validation_result['is_valid'])
+        submission.status = 'completed' if submission.is_correct else 'failed'
+        submission.feedback = validation_result
+    saved = Submission.objects.filter(pk=submission.pk, status='running', queued_at=submission.queued_at).update(
+        status=submission.status, is_correct=submission.is_correct, feedback=submission.feedback
+    )
+    if not saved:
+        logger.info(f"Dropped the verdict for submission {submission.pk}; it was resubmitted during grading")
+        return submission
+    log_attempt(submission, round((time.perf_counter() - started) * 1000))
+
+    if submission.is_correct:
+        record_solve(submission.user, submission.puzzle)
+    return submission
+
+
+def process_queue(max_jobs=None):
+    """Grade pending submissions until the queue is empty or max_jobs is reached."""
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        close_old_connections()
+        submission = claim_next_submission()
+        if submission is None:
+            break
+        grade_submission(submission)
+        processed += 1
+    return processed
+
+
+def requeue_stale_submissions(older_than):
+    """Put submissions stuck in 'running' (e.g. after a worker crash) back in the queue."""
+    cutoff = timezone.now() - older_than
+    return Submission.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='pending', started_at=None
+    )
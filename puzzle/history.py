@@ -0,0 +1,72 @@
+"""Profile page queries: keyset-paginated submission history and per-category stats."""
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_datetime
+
+from .models import Puzzle, Submission, UserProfile
+from .utils import encode_cursor, decode_cursor
+
+PAGE_SIZE = 20
+RECENT_SOLVED = 10
+
+LEVEL_DISPLAY = dict(Puzzle.LEVEL_CHOICES)
+CATEGORY_DISPLAY = dict(Puzzle.CATEGORIES)
+
+
+def parse_cursor(token):
+    """Return the (submitted_at, id) sort key encoded in a history cursor, or None."""
+    try:
+        submitted_at, submission_id = decode_cursor(token)
+        submitted_at = parse_datetime(submitted_at)
+        if submitted_at is None:
+            return None
+        return submitted_at, int(submission_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_history_page(user, cursor_token=None, page_size=PAGE_SIZE):
+    """Return one page of the user's submissions, newest first, plus the next page's cursor."""
+    submissions = (Submission.objects.filter(user=user)
+                   .select_related('puzzle')
+                   .only('id', 'is_correct', 'status', 'feedback', 'submitted_at', 'puzzle__id', 'puzzle__title'))
+    cursor = parse_cursor(cursor_token)
+    if cursor is not None:
+        submitted_at, submission_id = cursor
+        submissions = submissions.filter(
+            Q(submitted_at__lt=submitted_at) | Q(submitted_at=submitted_at, id__lt=submission_id)
+        )
+    rows = list(submissions.order_by('-submitted_at', '-id')[:page_size + 1])
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1].submitted_at.isoformat(), rows[-1].id])
+    return rows, next_cursor
+
+
+def get_summary(user):
+    """Attempted, solved and points per category and level, from one grouped aggregate."""
+    rows = (Submission.objects.filter(user=user)
+            .order_by('puzzle__category', 'puzzle__level')
+            .values('puzzle__category', 'puzzle__level')
+            .annotate(attempted=Count('id'),
+                      solved=Count('id', filter=Q(is_correct=True)),
+                      points=Sum('puzzle__points', filter=Q(is_correct=True))))
+    summary = []
+    for row in rows:
+        summary.append({
+            'category': CATEGORY_DISPLAY.get(row['puzzle__category'], row['puzzle__category']),
+            'level': LEVEL_DISPLAY.get(row['puzzle__level'], row['puzzle__level']),
+            'attempted': row['attempted'],
+            'solved': row['solved'],
+            'points': row['points'] or 0,
+        })
+    return summary
+
+
+def get_recent_solved(profile, limit=RECENT_SOLVED):
+    """The most recently solved puzzles as (id, title) dicts."""
+    return list(UserProfile.solved_puzzles.through.objects
+                .filter(userprofile_id=profile.pk)
+                .order_by('-id')
+                .values('puzzle_id', 'puzzle__title')[:limit])
@@ -0,0 +1,444 @@
+"""The one LLM client used by grading, puzzle generation and puzzle editing.
+
+Backends are selected by settings.LLM['BACKEND']: ``gemini`` talks to Google
+Gemini through one configured SDK client; ``stub`` answers deterministically
+from the prompt so CI and load tests run without network access. The client
+wraps either backend with a per-call deadline, jittered exponential retries,
+a cap on concurrent in-flight calls and latency bookkeeping.
+
+``agenerate`` is the coroutine twin of ``generate`` for async views: the
+wait for the model happens on the event loop, so one ASGI worker can keep
+ASYNC_MAX_CONCURRENCY calls in flight instead of one per thread. ``astream``
+yields the response in chunks as the model produces them.
+"""
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'gemini',     # 'gemini' or 'stub'
+    'MODEL': 'gemini-1.5-flash',
+    'TIMEOUT': 30,           # seconds per call, shared by all its retries
+    'RETRIES': 2,            # extra attempts after a transient failure
+    'BACKOFF': 0.5,          # base delay in seconds, doubled per retry and jittered
+    'MAX_CONCURRENCY': 4,    # in-flight calls per process from sync code
+    'ASYNC_MAX_CONCURRENCY': 256,  # in-flight calls per event loop from async code
+    'STUB_LATENCY': 0,       # seconds the stub backend sleeps per call
+}
+
+LATENCY_WINDOW = 1000
+
+
+class LLMError(Exception):
+    """An LLM call failed after its retries, or could not be made."""
+
+
+class LLMTimeout(LLMError):
+    """An LLM call did not finish within its deadline."""
+
+
+def get_settings():
+    return {**DEFAULTS, **getattr(settings, 'LLM', {})}
+
+
+def extract_json(text):
+    """Parse the JSON payload of a response, unwrapping ```json fences if present."""
+    text = text.strip()
+    json_match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
+    if json_match:
+        text = json_match.group(1)
+    return json.loads(text)
+
+
+class GeminiBackend:
+    name = 'gemini'
+
+    def __init__(self, api_key):
+        import google.generativeai as genai
+        from google.api_core import exceptions
+
+        if not api_key:
+            raise LLMError("GEMINI_API_KEY is not set")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models = {}
+        self._lock = threading.Lock()
+        self.transient_errors = (
+            exceptions.TooManyRequests,
+            exceptions.ServiceUnavailable,
+            exceptions.InternalServerError,
+            exceptions.DeadlineExceeded,
+            ConnectionError,
+            TimeoutError,
+        )
+
+    def _model(self, name):
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self._genai.GenerativeModel(name)
+            return self._models[name]
+
+    def generate(self, prompt, model, timeout):
+        response = self._model(model).generate_content(
+            prompt, request_options={'timeout': timeout}
+        )
+        return response.text
+
+    async def agenerate(self, prompt, model, timeout):
+        response = await self._model(model).generate_content_async(
+            prompt, request_options={'timeout': timeout}
+        )
+        return response.text
+
+    async def astream(self, prompt, model, timeout):
+        response = await self._model(model).generate_content_async(
+            prompt, stream=True, request_options={'timeout': timeout}
+        )
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubBackend:
+    """Deterministic offline answers shaped like the prompts this app sends."""
+    name = 'stub'
+    transient_errors = ()
+    STREAM_CHUNKS = 8
+
+    def __init__(self, latency=0):
+        self.latency = latency
+
+    def generate(self, prompt, model, timeout):
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+        return self.answer(prompt)
+
+    async def agenerate(self, prompt, model, timeout):
+        if self.latency:
+            await asyncio.sleep(min(self.latency, timeout))
+        return self.answer(prompt)
+
+    async def astream(self, prompt, model, timeout):
+        # STUB_LATENCY is spread over STREAM_CHUNKS chunks
+        text = self.answer(prompt)
+        size = -(-len(text) // self.STREAM_CHUNKS)
+        for start in range(0, len(text), size):
+            if self.latency:
+                await asyncio.sleep(self.latency / self.STREAM_CHUNKS)
+            yield text[start:start + size]
+
+    def answer(self, prompt):
+        seed = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+
+        if 'Validate this Python code' in prompt:
+            code = prompt.split('```python', 1)[-1].rsplit('```', 1)[0]
+            try:
+                ast.parse(code.strip())
+                return json.dumps({'is_valid': True, 'message': "Stub: the code parses.", 'errors': []})
+            except SyntaxError as e:
+                return json.dumps({'is_valid': False, 'message': "Stub: syntax error.", 'errors': [str(e)]})
+
+        mcq = 'MCQ' in prompt
+        if prompt.lstrip().startswith('Return only valid JSON') or 'Update this' in prompt:
+            return json.dumps(self._puzzle(f'Updated {seed}', mcq))
+
+        count = re.search(r'Generate (\d+)', prompt)
+        count = int(count.group(1)) if count else 1
+        return '```json\n' + json.dumps(
+            [self._puzzle(f'Stub puzzle {seed}-{i + 1}', mcq) for i in range(count)]
+        ) + '\n```'
+
+    @staticmethod
+    def _puzzle(title, mcq):
+        puzzle = {'title': title, 'description': f"Deterministic stub content for {title}."}
+        if mcq:
+            puzzle['options'] = {'A': 'First', 'B': 'Second', 'C': 'Third', 'D': 'Fourth'}
+            puzzle['correct_answer'] = 'A'
+        else:
+            puzzle['test_cases'] = {
+                'test1': {'input': '1', 'output': '1'},
+                'test2': {'input': '2', 'output': '2'},
+            }
+        return puzzle
+
+
+class RetryPolicy:
+    """Deadline, retries and bookkeeping for one logical call, shared by every entry point.
+
+    run() and arun() drive a single-attempt callable, passed the seconds left
+    before the deadline, and wait between attempts with the given delay
+    function. astream() uses the same pieces around its own loop, since it
+    yields chunks rather than returning a result.
+    """
+
+    def __init__(self, client, purpose, timeout):
+        self.client = client
+        self.purpose = purpose
+        self.deadline = time.monotonic() + (timeout or client.timeout)
+        self.started = time.perf_counter()
+        self.outcome = 'error'
+        client._count('calls')
+
+    def remaining(self):
+        """Seconds left for the next attempt; raises LLMTimeout once the deadline has passed."""
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeout(f"{self.purpose} call exceeded its deadline")
+        return remaining
+
+    def backoff(self, error, attempt, retryable=True):
+        """Return the delay before retrying after ``error``, or raise it as an LLMError."""
+        client = self.client
+        if isinstance(error, LLMTimeout):
+            self.outcome = 'timeout'
+            client._count('timeouts')
+            raise error
+        if isinstance(error, LLMError):
+            client._count('errors')
+            raise error
+        if not isinstance(error, client.backend.transient_errors):
+            client._count('errors')
+            raise LLMError(f"{self.purpose} call failed: {error}") from error
+        if not retryable or attempt == client.retries:
+            client._count('errors')
+            raise LLMError(f"{self.purpose} call failed after {attempt + 1} attempts: {error}") from error
+        delay = min(client.backoff * 2 ** attempt, max(self.deadline - time.monotonic(), 0))
+        delay *= random.uniform(0.5, 1)
+        logger.warning(f"Transient {self.purpose} failure, retrying in {delay:.2f}s: {error}")
+        client._count('retries')
+        return delay
+
+    def result(self, text, started):
+        if not text or not text.strip():
+            raise LLMError(f"Empty {self.purpose} response")
+        logger.debug(f"{self.purpose} call took {(time.perf_counter() - started) * 1000:.0f}ms")
+        self.outcome = 'ok'
+        return text
+
+    def finish(self):
+        """Record the call's duration and outcome; returns the duration in seconds."""
+        elapsed = time.perf_counter() - self.started
+        metrics.record_llm(self.purpose, elapsed, self.outcome)
+        return elapsed
+
+    def run(self, attempt_call, delay=time.sleep):
+        try:
+            for attempt in range(self.client.retries + 1):
+                started = time.perf_counter()
+                try:
+                    return self.result(attempt_call(self.remaining()), started)
+                except Exception as e:
+                    delay(self.backoff(e, attempt))
+        finally:
+            self.finish()
+
+    async def arun(self, attempt_call, delay=asyncio.sleep):
+        try:
+            for attempt in range(self.client.retries + 1):
+                started = time.perf_counter()
+                try:
+                    return self.result(await attempt_call(self.remaining()), started)
+                except Exception as e:
+                    await delay(self.backoff(e, attempt))
+        finally:
+            self.finish()
+
+
+class LLMClient:
+    def __init__(self, backend, options):
+        self.backend = backend
+        self.model = options['MODEL']
+        self.timeout = options['TIMEOUT']
+        self.retries = options['RETRIES']
+        self.backoff = options['BACKOFF']
+        self._slots = threading.BoundedSemaphore(options['MAX_CONCURRENCY'])
+        self._async_limit = options['ASYNC_MAX_CONCURRENCY']
+        self._async_slots = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counts = {'calls': 0, 'errors': 0, 'retries': 0, 'timeouts': 0, 'in_flight': 0}
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._counts[key] += delta
+
+    def _attempt(self, prompt, model, remaining):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=remaining):
+            raise LLMTimeout("Timed out waiting for a free LLM slot")
+        remaining -= time.perf_counter() - started
+        self._count('in_flight')
+        started = time.perf_counter()
+        try:
+            if remaining <= 0:
+                raise LLMTimeout("LLM call exceeded its deadline")
+            return self.backend.generate(prompt, model, remaining)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._count('in_flight', -1)
+            self._slots.release()
+            with self._lock:
+                self._latencies.append(elapsed)
+
+    def _loop_slots(self):
+        # asyncio primitives belong to one event loop, and sync callers of
+        # async code (async_to_sync under WSGI) each run their own loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._async_slots.get(loop)
+            if slots is None:
+                slots = self._async_slots[loop] = asyncio.BoundedSemaphore(self._async_limit)
+            return slots
+
+    async def _aacquire(self, remaining):
+        """Take an async slot within ``remaining`` seconds; returns the semaphore to release."""
+        slots = self._loop_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), remaining)
+        except asyncio.TimeoutError:
+            raise LLMTimeout("Timed out waiting for a free LLM slot") from None
+        self._count('in_flight')
+        return slots
+
+    async def _aattempt(self, prompt, model, remaining):
+        started = time.perf_counter()
+        slots = await self._aacquire(remaining)
+        remaining -= time.perf_counter() - started
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self.backend.agenerate(prompt, model, remaining), remaining)
+        except asyncio.TimeoutError:
+            raise LLMTimeout("LLM call exceeded its deadline") from None
+        finally:
+            elapsed = time.perf_counter() - started
+            self._count('in_flight', -1)
+            slots.release()
+            with self._lock:
+                self._latencies.append(elapsed)
+
+    def generate(self, prompt, model=None, timeout=None, purpose='llm'):
+        """Return the response text for a prompt, retrying transient failures until the deadline."""
+        model = model or self.model
+        return RetryPolicy(self, purpose, timeout).run(
+            lambda remaining: self._attempt(prompt, model, remaining)
+        )
+
+    async def agenerate(self, prompt, model=None, timeout=None, purpose='llm'):
+        """Async version of generate(), for use from async views."""
+        model = model or self.model
+        return await RetryPolicy(self, purpose, timeout).arun(
+            lambda remaining: self._aattempt(prompt, model, remaining)
+        )
+
+    async def astream(self, prompt, model=None, timeout=None, purpose='llm'):
+        """Yield the response text in chunks as the model produces them.
+
+        The deadline covers the whole stream. Transient failures are retried
+        only until the first chunk has been yielded; after that they raise.
+        """
+        model = model or self.model
+        policy = RetryPolicy(self, purpose, timeout)
+        first_chunk = None
+        slots = await self._aacquire(policy.remaining())
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    stream = self.backend.astream(prompt, model, policy.remaining()).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), policy.remaining())
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            raise LLMTimeout(f"{purpose} stream exceeded its deadline") from None
+                        if chunk:
+                            if first_chunk is None:
+                                first_chunk = time.perf_counter() - policy.started
+                                metrics.record_llm_first_chunk(purpose, first_chunk)
+                            yield chunk
+                    if first_chunk is None:
+                        raise LLMError(f"Empty {purpose} response")
+                    policy.outcome = 'ok'
+                    return
+                except Exception as e:
+                    await asyncio.sleep(policy.backoff(e, attempt, retryable=first_chunk is None))
+        finally:
+            self._count('in_flight', -1)
+            slots.release()
+            elapsed = policy.finish()
+            with self._lock:
+                self._latencies.append(elapsed)
+
+    def stats(self):
+        """Call counters plus latency percentiles (ms) over the last LATENCY_WINDOW calls."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counts, backend=self.backend.name)
+        if latencies:
+            stats.update(
+                p50_ms=round(latencies[len(latencies) // 2] * 1000, 1),
+                p95_ms=round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+                max_ms=round(latencies[-1] * 1000, 1),
+            )
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def build_backend(options):
+    if options['BACKEND'] == 'stub':
+        return StubBackend(latency=options['STUB_LATENCY'])
+    if options['BACKEND'] == 'gemini':
+        return GeminiBackend(getattr(settings, 'GEMINI_API_KEY', ''))
+    raise LLMError(f"Unknown LLM backend {options['BACKEND']!r}")
+
+
+def get_client():
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = get_settings()
+                _client = LLMClient(build_backend(options), options)
+    return _client
+
+
+def current_stats():
+    """Stats of the shared client, or None if no call has been made in this process."""
+    client = _client
+    return client.stats() if client is not None else None
+
+
+def reset_client():
+    """Drop the shared client so the next call picks up changed settings."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def generate(prompt, **kwargs):
+    return get_client().generate(prompt, **kwargs)
+
+
+async def agenerate(prompt, **kwargs):
+    return await get_client().agenerate(prompt, **kwargs)
+
+
+def astream(prompt, **kwargs):
+    return get_client().astream(prompt, **kwargs)
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from puzzle.models import ArchivedAttempt, Attempt
+
+ARCHIVED_FIELDS = ['id', 'user_id', 'puzzle_id', 'answer', 'code', 'is_correct', 'status',
+                   'verdict', 'engine', 'latency_ms', 'created_at']
+
+
+class Command(BaseCommand):
+    help = "Move attempts older than the retention window from the attempt log to the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            default=getattr(settings, 'ATTEMPT_RETENTION_DAYS', 90),
+                            help="Archive attempts older than this many days (default: ATTEMPT_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Attempts moved per transaction (default: 5000).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report how many attempts would be archived without moving them.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        old_attempts = Attempt.objects.filter(created_at__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{old_attempts.count()} attempts older than {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        started = time.perf_counter()
+        moved = 0
+        while True:
+            # Copy then delete each batch in one transaction, so a row is never in both tables
+            with transaction.atomic():
+                rows = list(old_attempts.order_by('id').values(*ARCHIVED_FIELDS)[:options['batch_size']])
+                if not rows:
+                    break
+                ArchivedAttempt.objects.bulk_create([ArchivedAttempt(**row) for row in rows])
+                Attempt.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            moved += len(rows)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Archived {moved} attempts older than {cutoff:%Y-%m-%d} in {elapsed:.2f}s.")
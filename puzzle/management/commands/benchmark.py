@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from puzzle import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic dataset into a throwaway test database, time the main views "
+            "and compare query counts against the committed baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--puzzles', type=int, default=benchmark.DEFAULT_SIZES['puzzles'])
+        parser.add_argument('--users', type=int, default=benchmark.DEFAULT_SIZES['users'])
+        parser.add_argument('--submissions', type=int, default=benchmark.DEFAULT_SIZES['submissions'])
+        parser.add_argument('--iterations', type=int, default=20,
+                            help="Requests per scenario (default: 20).")
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO',
+                            help="Run only the named scenarios.")
+        parser.add_argument('--output', default='benchmarks/latest.json',
+                            help="Where to write the JSON report (default: benchmarks/latest.json).")
+        parser.add_argument('--baseline', default=str(benchmark.BASELINE_PATH),
+                            help="Baseline report to compare against.")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Write the results to the baseline instead of comparing.")
+        parser.add_argument('--latency-tolerance', type=float, default=None,
+                            help="Also fail when p95 latency exceeds this multiple of the baseline.")
+        parser.add_argument('--signups', type=int, default=0,
+                            help="Also time this many signups of people sharing one name.")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the benchmark database afterwards.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        db_name = connection.creation.create_test_db(verbosity=0, keepdb=options['keepdb'])
+        try:
+            started = time.perf_counter()
+            sizes = benchmark.seed(options['puzzles'], options['users'], options['submissions'])
+            self.stdout.write(f"Seeded {sizes} in {time.perf_counter() - started:.1f}s")
+
+            results = benchmark.run_scenarios(options['iterations'], only=options['only'])
+            signups = benchmark.run_signups(options['signups']) if options['signups'] else None
+        finally:
+            connection.creation.destroy_test_db(db_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        for name, result in sorted(results.items()):
+            self.stdout.write(
+                f"{name:<18} {result['status']}  {result['queries']:>3} queries  "
+                f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms"
+            )
+
+        if signups:
+            self.stdout.write(
+                f"signup x{signups['signups']}: {signups['distinct_usernames']} distinct usernames, "
+                f"{signups['queries_first']} queries for the first, {signups['queries_min']}-{signups['queries_max']} "
+                f"for the rest  p50 {signups['p50_ms']:.2f}ms  p95 {signups['p95_ms']:.2f}ms"
+            )
+
+        if options['update_baseline']:
+            benchmark.write_report(options['baseline'], sizes, options['iterations'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        benchmark.write_report(options['output'], sizes, options['iterations'], results)
+        self.stdout.write(f"Report written to {options['output']}")
+
+        try:
+            baseline = benchmark.load_baseline(options['baseline'])
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(f"No baseline at {options['baseline']}; run with --update-baseline"))
+            return
+        if baseline.get('sizes') != sizes:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with {baseline.get('sizes')}; views whose query count "
+                "grows with the dataset will show up as regressions"
+            ))
+        regressions = benchmark.compare(results, baseline, options['latency_tolerance'])
+        if regressions:
+            raise CommandError("Benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from puzzle import transfer
+from puzzle.models import Puzzle
+
+
+class Command(BaseCommand):
+    help = "Stream the puzzle bank to a JSONL file (gzip-compressed for *.gz, stdout for '-')."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help="Output file (default: stdout).")
+        parser.add_argument('--category', choices=[code for code, _ in Puzzle.CATEGORIES])
+        parser.add_argument('--level', choices=[code for code, _ in Puzzle.LEVEL_CHOICES])
+
+    def handle(self, *args, **options):
+        puzzles = Puzzle.objects.all()
+        if options['category']:
+            puzzles = puzzles.filter(category=options['category'])
+        if options['level']:
+            puzzles = puzzles.filter(level=options['level'])
+
+        started = time.perf_counter()
+        out = transfer.open_output(options['path'])
+        try:
+            count = transfer.export_puzzles(out, puzzles)
+        finally:
+            if options['path'] != '-':
+                out.close()
+        if options['path'] != '-':
+            self.stdout.write(f"Exported {count} puzzles to {options['path']} "
+                              f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from puzzle import grading, sandbox
+
+
+class Command(BaseCommand):
+    help = "Run the grading worker: claim pending coding submissions and grade them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue once and exit instead of polling forever.")
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help="Seconds to sleep when the queue is empty (default: 0.5).")
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help="Re-queue submissions stuck in 'running' for this many seconds, checking as "
+                                 "often (default: 300).")
+
+    def handle(self, *args, **options):
+        # Probe the sandbox up front so a host without isolation is reported at startup
+        if not sandbox.available():
+            self.stderr.write("Sandbox isolation is unavailable; coding puzzles will be graded by the LLM")
+
+        stale_after = timedelta(seconds=options['stale_after'])
+        next_requeue = 0
+
+        self.stdout.write("Grading worker started")
+        try:
+            while True:
+                # Another worker may have crashed mid-grade since the last sweep
+                if time.monotonic() >= next_requeue:
+                    requeued = grading.requeue_stale_submissions(stale_after)
+                    if requeued:
+                        self.stdout.write(f"Re-queued {requeued} stale submissions")
+                    next_requeue = time.monotonic() + options['stale_after']
+                processed = grading.process_queue()
+                if processed:
+                    self.stdout.write(f"Graded {processed} submissions")
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Grading worker stopped")
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from puzzle import transfer
+
+
+class Command(BaseCommand):
+    help = ("Upsert puzzles from a JSONL file written by export_puzzles, matching on uid "
+            "(gzip-compressed for *.gz, stdin for '-').")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin.")
+        parser.add_argument('--batch-size', type=int, default=transfer.BATCH_SIZE,
+                            help=f"Puzzles per transaction (default: {transfer.BATCH_SIZE}).")
+        parser.add_argument('--skip-existing', action='store_true',
+                            help="Leave puzzles whose uid already exists untouched.")
+        parser.add_argument('--skip-near-duplicates', action='store_true',
+                            help="Also skip puzzles whose title and description closely match another puzzle's.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            source = transfer.open_input(options['path'])
+        except OSError as e:
+            raise CommandError(str(e))
+        with source:
+            result = transfer.import_puzzles(source, options['batch_size'],
+                                             update_existing=not options['skip_existing'],
+                                             skip_near=options['skip_near_duplicates'])
+
+        for number, error in result['errors']:
+            self.stderr.write(f"line {number}: {error}")
+        problems = result['skipped'] + result['duplicates']
+        if problems > len(result['errors']):
+            self.stderr.write(f"... and {problems - len(result['errors'])} more skipped lines")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, updated {result['updated']}, skipped {result['skipped']} invalid "
+            f"and {result['duplicates']} duplicate in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from puzzle import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Fire concurrent coding solves, graded inline against a slow stub LLM, through "
+            "the WSGI path (a thread pool) and the ASGI path (one event loop) and compare throughput.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help="Solve requests per path (default: 200).")
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help="Worker threads for the WSGI path (default: 8).")
+        parser.add_argument('--llm-latency', type=float, default=1.0,
+                            help="Seconds the stub LLM takes per call (default: 1.0).")
+        parser.add_argument('--output', help="Also write the results as JSON to this path.")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the load test database afterwards.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        db_name = connection.creation.create_test_db(verbosity=0, keepdb=options['keepdb'])
+        try:
+            benchmark.seed(puzzles=30, users=50, submissions=0)
+            results = benchmark.run_solve_load(
+                options['requests'], options['wsgi_threads'], options['llm_latency']
+            )
+        finally:
+            connection.creation.destroy_test_db(db_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        for path, result in results.items():
+            self.stdout.write(
+                f"{path.upper():<5} {result['requests']} requests in {result['seconds']:.2f}s  "
+                f"{result['throughput_rps']:>7.1f} req/s  p50 {result['p50_ms']:>8.1f}ms  "
+                f"p95 {result['p95_ms']:>8.1f}ms  statuses {result['statuses']}"
+            )
+        if results['wsgi']['throughput_rps']:
+            gain = results['asgi']['throughput_rps'] / results['wsgi']['throughput_rps']
+            self.stdout.write(self.style.SUCCESS(f"ASGI throughput is {gain:.1f}x WSGI"))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+                f.write('\n')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from puzzle.verdict_cache import verdict_cache
+
+
+class Command(BaseCommand):
+    help = "Evict expired LLM verdicts and report the verdict cache hit rate."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help="Delete every cached verdict.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            verdict_cache.clear()
+            self.stdout.write("Verdict cache cleared")
+            return
+
+        deleted = verdict_cache.prune()
+        stats = verdict_cache.stats()
+        self.stdout.write(f"Evicted {deleted} verdicts")
+        self.stdout.write(
+            f"{stats['db_entries']} cached verdicts, "
+            f"persistent hit rate {stats['db_hit_rate']:.1%}"
+        )
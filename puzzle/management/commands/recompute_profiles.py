@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from puzzle import solved_set
+from puzzle.models import ScoreBucket, UserProfile
+
+
+class Command(BaseCommand):
+    help = ("Recompute total_points, puzzles_solved and the solved bitmap of every profile "
+            "from the solved_puzzles table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Profiles recomputed per aggregate query (default: 1000).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drifted profiles without writing.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        started = time.perf_counter()
+        last_pk = 0
+        checked = drifted = bitmaps = 0
+
+        while True:
+            profiles = list(UserProfile.objects.filter(pk__gt=last_pk)
+                            .order_by('pk')
+                            .only('pk', 'user_id', 'total_points', 'puzzles_solved')[:batch_size])
+            if not profiles:
+                break
+            last_pk = profiles[-1].pk
+
+            # The rows record_solve awards points from; is_correct changes on every re-grade
+            totals = {
+                row['userprofile_id']: row
+                for row in UserProfile.solved_puzzles.through.objects.filter(
+                    userprofile_id__in=[profile.pk for profile in profiles]
+                ).order_by().values('userprofile_id').annotate(points=Sum('puzzle__points'), solved=Count('puzzle_id'))
+            }
+
+            changed = []
+            for profile in profiles:
+                row = totals.get(profile.pk)
+                points = (row['points'] or 0) if row else 0
+                solved = row['solved'] if row else 0
+                if profile.total_points != points or profile.puzzles_solved != solved:
+                    profile.total_points = points
+                    profile.puzzles_solved = solved
+                    changed.append(profile)
+
+            if changed and not dry_run:
+                with transaction.atomic():
+                    UserProfile.objects.bulk_update(changed, ['total_points', 'puzzles_solved'])
+            if not dry_run:
+                bitmaps += solved_set.rebuild([profile.pk for profile in profiles])
+            checked += len(profiles)
+            drifted += len(changed)
+
+        if drifted and not dry_run:
+            # bulk_update bypasses save(), so recount the rank buckets in one pass
+            ScoreBucket.rebuild()
+
+        elapsed = time.perf_counter() - started
+        verb = "Found" if dry_run else "Fixed"
+        self.stdout.write(f"Checked {checked} profiles in {elapsed:.2f}s. {verb} {drifted} with drifted totals.")
+        if not dry_run:
+            self.stdout.write(f"Rebuilt {bitmaps} solved bitmaps.")
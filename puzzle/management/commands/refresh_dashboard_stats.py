@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from puzzle import stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the admin dashboard statistics snapshot from the source tables."
+
+    def handle(self, *args, **options):
+        snapshot = stats.rebuild()
+        self.stdout.write(
+            f"Snapshot rebuilt: {snapshot.total_users} users, {snapshot.total_puzzles} puzzles, "
+            f"{snapshot.total_submissions} submissions"
+        )
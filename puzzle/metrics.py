@@ -0,0 +1,190 @@
+"""In-process request metrics: per-request timings and Prometheus-style aggregates.
+
+PerformanceMiddleware puts a RequestTimings in a context variable for the
+duration of each request; the SQL execute wrapper, the timed template backend
+and the LLM client add to it. Finished requests are folded into the
+process-wide ``registry``, which /metrics renders in the Prometheus text
+format. Nothing leaves the process, so each worker reports its own figures.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+current = ContextVar('puzzle_request_timings', default=None)
+
+
+class RequestTimings:
+    """What one request spent in the database, templates and LLM calls."""
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.llm_count = 0
+        self.llm_seconds = 0.0
+        self._template_depth = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_count += 1
+            self.db_seconds += time.perf_counter() - started
+
+    def server_timing(self, total_seconds):
+        """Format the timings as a Server-Timing header value (durations in ms)."""
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_count} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f};desc="templates"',
+            f'llm;dur={self.llm_seconds * 1000:.1f};desc="{self.llm_count} calls"',
+            f'total;dur={total_seconds * 1000:.1f}',
+        ])
+
+
+@contextmanager
+def template_timer():
+    """Time a template render, counting only the outermost one when they nest."""
+    timings = current.get()
+    if timings is None:
+        yield
+        return
+    timings._template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._template_depth -= 1
+        if timings._template_depth == 0:
+            timings.template_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)  # (view, method, status) -> count
+            self.latency = {}  # view -> Histogram
+            self.view_totals = defaultdict(lambda: defaultdict(float))  # view -> component -> total
+            self.llm_calls = defaultdict(int)  # (purpose, outcome) -> count
+            self.llm_latency = {}  # purpose -> Histogram
+            self.llm_first_chunk = {}  # purpose -> Histogram, streamed calls only
+
+    def observe_request(self, view, method, status, seconds, timings):
+        with self._lock:
+            self.requests[(view, method, status)] += 1
+            self.latency.setdefault(view, Histogram(REQUEST_BUCKETS)).observe(seconds)
+            totals = self.view_totals[view]
+            totals['db_queries'] += timings.db_count
+            totals['db_seconds'] += timings.db_seconds
+            totals['template_seconds'] += timings.template_seconds
+            totals['llm_calls'] += timings.llm_count
+            totals['llm_seconds'] += timings.llm_seconds
+
+    def observe_llm(self, purpose, seconds, outcome):
+        with self._lock:
+            self.llm_calls[(purpose, outcome)] += 1
+            self.llm_latency.setdefault(purpose, Histogram(LLM_BUCKETS)).observe(seconds)
+
+    def observe_llm_first_chunk(self, purpose, seconds):
+        with self._lock:
+            self.llm_first_chunk.setdefault(purpose, Histogram(LLM_BUCKETS)).observe(seconds)
+
+    def render(self, gauges=None):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP puzzle_requests_total Requests handled, by view, method and status.',
+                      '# TYPE puzzle_requests_total counter']
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'puzzle_requests_total{_labels(view=view, method=method, status=status)} {count}')
+
+            _render_histogram(lines, 'puzzle_request_duration_seconds',
+                              'Request latency by view.', 'view', self.latency)
+
+            components = [
+                ('db_queries', 'puzzle_request_db_queries_total', 'SQL queries run by requests, by view.'),
+                ('db_seconds', 'puzzle_request_db_seconds_total', 'Time spent in SQL, by view.'),
+                ('template_seconds', 'puzzle_request_template_seconds_total', 'Time spent rendering templates, by view.'),
+                ('llm_calls', 'puzzle_request_llm_calls_total', 'LLM calls made during requests, by view.'),
+                ('llm_seconds', 'puzzle_request_llm_seconds_total', 'Time spent waiting on the LLM during requests, by view.'),
+            ]
+            for key, name, help_text in components:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for view, totals in sorted(self.view_totals.items()):
+                    lines.append(f'{name}{_labels(view=view)} {totals[key]:g}')
+
+            lines += ['# HELP puzzle_llm_calls_total LLM calls in this process, by purpose and outcome.',
+                      '# TYPE puzzle_llm_calls_total counter']
+            for (purpose, outcome), count in sorted(self.llm_calls.items()):
+                lines.append(f'puzzle_llm_calls_total{_labels(purpose=purpose, outcome=outcome)} {count}')
+
+            _render_histogram(lines, 'puzzle_llm_call_duration_seconds',
+                              'LLM call latency, including retries.', 'purpose', self.llm_latency)
+            _render_histogram(lines, 'puzzle_llm_first_chunk_seconds',
+                              'Time to the first chunk of streamed LLM calls.', 'purpose', self.llm_first_chunk)
+
+        for name, (help_text, value) in sorted((gauges or {}).items()):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(lines, name, help_text, label, histograms):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(**{label: key, "le": f"{bound:g}"})} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(**{label: key, "le": "+Inf"})} {histogram.count}')
+        lines.append(f'{name}_sum{_labels(**{label: key})} {histogram.sum:g}')
+        lines.append(f'{name}_count{_labels(**{label: key})} {histogram.count}')
+
+
+registry = Registry()
+
+
+def record_llm(purpose, seconds, outcome):
+    """Count an LLM call in the process totals and, inside a request, in its timings."""
+    registry.observe_llm(purpose, seconds, outcome)
+    timings = current.get()
+    if timings is not None:
+        timings.llm_count += 1
+        timings.llm_seconds += seconds
+
+
+def record_llm_first_chunk(purpose, seconds):
+    registry.observe_llm_first_chunk(purpose, seconds)
@@ -0,0 +1,189 @@
+import mimetypes
+import os
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+
+from . import metrics
+from .storage import encoders
+
+
+class PerformanceMiddleware:
+    """Time each request's SQL, template and LLM work.
+
+    The breakdown is sent back as a Server-Timing header and folded into the
+    per-view aggregates served by /metrics. Keep this first in MIDDLEWARE so
+    the total covers the rest of the stack.
+
+    Under ASGI the SQL wrappers are installed from the request's sync thread,
+    where Django runs the ORM calls of async views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = metrics.RequestTimings()
+        token = metrics.current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self._wrap_connections(stack, timings)
+                response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = metrics.RequestTimings()
+        token = metrics.current.set(timings)
+        started = time.perf_counter()
+        stack = ExitStack()
+        try:
+            await sync_to_async(self._wrap_connections)(stack, timings)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            metrics.current.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - started)
+
+    @staticmethod
+    def _wrap_connections(stack, timings):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings.sql_wrapper))
+
+    def _finish(self, request, response, timings, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.observe_request(view, request.method, response.status_code, elapsed, timings)
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing(elapsed)
+        return response
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q > 0), lower-cased."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAssetMiddleware:
+    """Serve files collected into STATIC_ROOT, picking a precompressed variant.
+
+    STATIC_ROOT is indexed once at startup, so a request only touches the
+    filesystem to open the file it is sent. Content-hashed names from the
+    staticfiles manifest are cached for a year as immutable; other files
+    must be revalidated. Place it right after SecurityMiddleware. It does
+    nothing without a collected STATIC_ROOT, and under runserver the
+    development static handler answers first.
+    """
+    sync_capable = True
+    async_capable = True
+
+    HASHED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    UNHASHED_CACHE_CONTROL = 'public, max-age=60, must-revalidate'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/') if settings.STATIC_URL and '://' not in settings.STATIC_URL else None
+        self.files = self._index(settings.STATIC_ROOT) if self.prefix and settings.STATIC_ROOT else {}
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    @staticmethod
+    def _index(root):
+        """Map each servable name to its headers and {encoding: (path, size)} variants."""
+        if not os.path.isdir(root):
+            return {}
+        hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        suffixes = {suffix: encoding for encoding, suffix, _ in encoders()}
+        suffixes.setdefault('.gz', 'gzip')
+        suffixes.setdefault('.br', 'br')
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                stem, suffix = os.path.splitext(name)
+                if suffix in suffixes and os.path.isfile(os.path.join(root, stem)):
+                    continue
+                stat = os.stat(path)
+                content_type, _ = mimetypes.guess_type(name)
+                content_type = content_type or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type in ('application/json', 'image/svg+xml'):
+                    content_type += '; charset=utf-8'
+                variants = {None: (path, stat.st_size)}
+                for variant_suffix, encoding in suffixes.items():
+                    if os.path.isfile(path + variant_suffix):
+                        variants[encoding] = (path + variant_suffix, os.path.getsize(path + variant_suffix))
+                files[name] = {
+                    'content_type': content_type,
+                    'cache_control': StaticAssetMiddleware.HASHED_CACHE_CONTROL if name in hashed
+                    else StaticAssetMiddleware.UNHASHED_CACHE_CONTROL,
+                    'etag': f'"{int(stat.st_mtime)}-{stat.st_size}"',
+                    'variants': variants,
+                }
+        return files
+
+    def serve(self, request):
+        if not self.files or request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        entry = self.files.get(request.path[len(self.prefix):])
+        if entry is None:
+            return None
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        # br before gzip: smaller for the same text
+        encoding = next((coding for coding in ('br', 'gzip') if coding in entry['variants'] and coding in accepted), None)
+        path, size = entry['variants'][encoding]
+        etag = entry['etag'][:-1] + (f'-{encoding}"' if encoding else '"')
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=entry['content_type'])
+            response['Content-Length'] = size
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=entry['content_type'])
+            # FileResponse names the file it was given, which here may be the .gz/.br variant
+            del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if len(entry['variants']) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = entry['cache_control']
+        response['ETag'] = etag
+        return response
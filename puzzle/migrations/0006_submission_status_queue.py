@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_existing_completed(apps, schema_editor):
+    Submission = apps.get_model("puzzle", "Submission")
+    Submission.objects.update(status="completed")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0005_remove_submission_puzzle_subm_user_id_9f0221_idx_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="queued_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("completed", "Completed"),
+                    ("failed", "Failed"),
+                    ("error", "Error"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+        # Existing submissions were graded synchronously; don't re-queue them
+        migrations.RunPython(mark_existing_completed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["queued_at"],
+                name="puzzle_subm_pending_idx",
+            ),
+        ),
+    ]
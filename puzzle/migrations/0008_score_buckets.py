@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_score_buckets(apps, schema_editor):
+    UserProfile = apps.get_model("puzzle", "UserProfile")
+    ScoreBucket = apps.get_model("puzzle", "ScoreBucket")
+    counts = (
+        UserProfile.objects.order_by()
+        .values("total_points")
+        .annotate(profiles=models.Count("id"))
+    )
+    ScoreBucket.objects.bulk_create(
+        [
+            ScoreBucket(points=row["total_points"], profiles=row["profiles"])
+            for row in counts
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0007_verdictcacheentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("points", models.IntegerField(unique=True)),
+                ("profiles", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="userprofile",
+            index=models.Index(
+                fields=["-total_points", "id"], name="puzzle_profile_rank_idx"
+            ),
+        ),
+        migrations.RunPython(populate_score_buckets, migrations.RunPython.noop),
+    ]
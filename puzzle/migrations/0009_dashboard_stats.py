@@ -0,0 +1,90 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0008_score_buckets"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyActivity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("submissions", models.IntegerField(default=0)),
+                ("solves", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name_plural": "daily activity",
+            },
+        ),
+        migrations.CreateModel(
+            name="SiteStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_users", models.IntegerField(default=0)),
+                ("total_puzzles", models.IntegerField(default=0)),
+                ("total_submissions", models.IntegerField(default=0)),
+                ("beginner_puzzles", models.IntegerField(default=0)),
+                ("intermediate_puzzles", models.IntegerField(default=0)),
+                ("expert_puzzles", models.IntegerField(default=0)),
+                ("top_solvers", models.JSONField(default=list)),
+                ("submissions_per_day", models.JSONField(default=list)),
+                ("rollups_refreshed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "site stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="DailySolverActivity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("solves", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily solver activity",
+                "indexes": [models.Index(fields=["day"], name="puzzle_solver_day_idx")],
+                "unique_together": {("user", "day")},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0010_generation_job"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                fields=["user", "-submitted_at", "-id"], name="puzzle_subm_history_idx"
+            ),
+        ),
+    ]
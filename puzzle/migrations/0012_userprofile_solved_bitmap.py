@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+def populate_solved_bitmaps(apps, schema_editor):
+    UserProfile = apps.get_model("puzzle", "UserProfile")
+    Through = UserProfile.solved_puzzles.through
+    bitmaps = {}
+    pairs = Through.objects.values_list("userprofile_id", "puzzle_id")
+    for profile_id, puzzle_id in pairs.iterator():
+        bits = bitmaps.setdefault(profile_id, bytearray())
+        byte = puzzle_id >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        bits[byte] |= 1 << (puzzle_id & 7)
+    profiles = []
+    for profile_id, bits in bitmaps.items():
+        profiles.append(UserProfile(pk=profile_id, solved_bitmap=bytes(bits)))
+    UserProfile.objects.bulk_update(profiles, ["solved_bitmap"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0011_submission_history_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="solved_bitmap",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.RunPython(populate_solved_bitmaps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0013_attempt_log"),
+    ]
+
+    operations = [
+        # Nullable first: a callable default would give every existing row the same value
+        migrations.AddField(
+            model_name="puzzle",
+            name="uid",
+            field=models.UUIDField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:02
+
+import uuid
+
+from django.db import migrations
+
+
+def populate_uids(apps, schema_editor):
+    Puzzle = apps.get_model("puzzle", "Puzzle")
+    pending = Puzzle.objects.filter(uid__isnull=True).only("pk")
+    batch = []
+    for puzzle in pending.iterator(chunk_size=2000):
+        puzzle.uid = uuid.uuid4()
+        batch.append(puzzle)
+        if len(batch) >= 2000:
+            Puzzle.objects.bulk_update(batch, ["uid"])
+            batch = []
+    if batch:
+        Puzzle.objects.bulk_update(batch, ["uid"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0014_puzzle_uid"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_uids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:02
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0015_populate_puzzle_uid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="puzzle",
+            name="uid",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="puzzle",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0016_alter_puzzle_uid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="puzzle",
+            name="signature",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.AddField(
+            model_name="puzzle",
+            name="title_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+        migrations.CreateModel(
+            name="SimilarityBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.BigIntegerField(db_index=True)),
+                (
+                    "puzzle",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similarity_buckets",
+                        to="puzzle.puzzle",
+                    ),
+                ),
+            ],
+        ),
+    ]
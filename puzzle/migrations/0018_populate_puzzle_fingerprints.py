@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:10
+
+from django.db import migrations
+
+from puzzle import minhash
+
+
+def populate_fingerprints(apps, schema_editor):
+    Puzzle = apps.get_model("puzzle", "Puzzle")
+    SimilarityBucket = apps.get_model("puzzle", "SimilarityBucket")
+    # Only the oldest puzzle with a title gets its hash; later repeats stay NULL
+    seen = set()
+    batch = []
+    buckets = []
+
+    def flush():
+        Puzzle.objects.bulk_update(batch, ["title_hash", "signature"])
+        SimilarityBucket.objects.bulk_create(buckets, batch_size=900)
+        batch.clear()
+        buckets.clear()
+
+    rows = Puzzle.objects.order_by("pk").only("pk", "title", "description")
+    for puzzle in rows.iterator(chunk_size=2000):
+        title_hash = minhash.title_hash(puzzle.title)
+        puzzle.title_hash = title_hash if title_hash not in seen else None
+        seen.add(title_hash)
+        signature = minhash.signature(f"{puzzle.title} {puzzle.description}")
+        puzzle.signature = minhash.pack(signature)
+        if signature:
+            buckets.extend(
+                SimilarityBucket(puzzle_id=puzzle.pk, bucket=bucket)
+                for bucket in minhash.band_buckets(signature)
+            )
+        batch.append(puzzle)
+        if len(batch) >= 2000:
+            flush()
+    if batch:
+        flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0017_puzzle_dedupe_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+    ]
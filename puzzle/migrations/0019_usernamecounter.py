@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0018_populate_puzzle_fingerprints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsernameCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("base", models.CharField(max_length=150, unique=True)),
+                ("last_suffix", models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("puzzle", "0019_usernamecounter"),
+    ]
+
+    operations = [
+        # auth.User belongs to another app, so its index can't go in Meta.indexes;
+        # the expression matches Lower("email") in puzzle.auth_backends
+        migrations.RunSQL(
+            'CREATE INDEX "puzzle_user_email_lower_idx" ON "auth_user" (LOWER("email"))',
+            'DROP INDEX "puzzle_user_email_lower_idx"',
+        ),
+    ]
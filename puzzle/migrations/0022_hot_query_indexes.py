@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("puzzle", "0021_codedraft"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="puzzle",
+            index=models.Index(
+                fields=["level", "-created_at", "-id"], name="puzzle_catalog_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="puzzle",
+            index=models.Index(
+                fields=["category", "level", "-created_at", "-id"],
+                name="puzzle_catalog_cat_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                fields=["-submitted_at", "-id"], name="puzzle_subm_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                condition=models.Q(("is_correct", True)),
+                fields=["user", "puzzle"],
+                name="puzzle_subm_solved_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="submission",
+            index=models.Index(
+                condition=models.Q(("status", "running")),
+                fields=["started_at"],
+                name="puzzle_subm_running_idx",
+            ),
+        ),
+    ]
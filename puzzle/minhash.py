@@ -0,0 +1,93 @@
+"""Title hashes and MinHash signatures for duplicate detection.
+
+Plain functions with no database access, so migrations can use them too.
+
+A signature is built by one permutation hashing: each word-bigram shingle of
+the title and description is hashed once, the hash picks one of NUM_BINS bins
+and each bin keeps its smallest value. Empty bins borrow from the next
+non-empty bin (rotation densification). The fraction of equal bins between two
+signatures estimates the Jaccard similarity of their shingle sets. For
+locality-sensitive lookup the signature is cut into BANDS bands of ROWS bins;
+puzzles sharing any band bucket are candidates.
+"""
+import hashlib
+import re
+import struct
+
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+
+_WORD = re.compile(r'\w+')
+_BIN_RANGE = 2 ** 64 // NUM_BINS
+_PACK = struct.Struct(f'>{NUM_BINS}Q')
+_BAND = struct.Struct(f'>B{ROWS}Q')
+
+
+def normalize_title(title):
+    """Lower-case words only, so case, punctuation and spacing don't make titles differ."""
+    return ' '.join(_WORD.findall((title or '').casefold()))
+
+
+def title_hash(title):
+    """SHA-256 of the normalized title, or None for a title without words."""
+    normalized = normalize_title(title)
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def shingles(text):
+    words = _WORD.findall((text or '').casefold())
+    if len(words) < 2:
+        return set(words)
+    return {f'{first} {second}' for first, second in zip(words, words[1:])}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def signature(text):
+    """The MinHash signature of a text as a list of NUM_BINS ints, or None if it has no words."""
+    bins = [None] * NUM_BINS
+    for value in map(_hash64, shingles(text)):
+        index = value % NUM_BINS
+        value //= NUM_BINS
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+    if all(value is None for value in bins):
+        return None
+    dense = list(bins)
+    for index, value in enumerate(bins):
+        if value is None:
+            distance = 1
+            while bins[(index + distance) % NUM_BINS] is None:
+                distance += 1
+            # Offset by the distance so borrowed values don't collide with real ones
+            dense[index] = bins[(index + distance) % NUM_BINS] + distance * _BIN_RANGE
+    return dense
+
+
+def pack(sig):
+    return _PACK.pack(*sig) if sig else b''
+
+
+def unpack(data):
+    return list(_PACK.unpack(bytes(data))) if data else None
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / NUM_BINS
+
+
+def band_buckets(sig):
+    """One signed 64-bit bucket id per band; the band number is part of the hash."""
+    buckets = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(_BAND.pack(band, *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
@@ -1,7 +1,14 @@
-from django.db import models
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Sum
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+from . import minhash
 
 class Puzzle(models.Model):
     CATEGORIES = [
@@ -43,23 +50,92 @@ class Puzzle(models.Model):
         null=True,
         help_text="Initial code template for coding puzzles"
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so import_puzzles can keep exported timestamps
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Stable identity across environments; import_puzzles upserts on it
+    uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Duplicate detection (see puzzle.dedupe): a hash of the normalized title, unique so
+    # the database rejects exact repeats, and a MinHash signature of title and description
+    title_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    signature = models.BinaryField(default=b'', blank=True, editable=False)
 
     def __str__(self):
         return self.title
 
+    def set_fingerprint(self):
+        """Derive title_hash and signature; bulk writers must call this since they skip save()."""
+        self.title_hash = minhash.title_hash(self.title)
+        self.signature = minhash.pack(minhash.signature(f'{self.title} {self.description}'))
+
+    def _title_taken(self, title_hash):
+        return bool(title_hash) and Puzzle.objects.filter(title_hash=title_hash).exclude(pk=self.pk).exists()
+
+    def _unedited_repeat(self):
+        """Whether this may be a repeated title migration 0018 left without a hash, with the title unchanged.
+
+        Those puzzles keep their title and a NULL title_hash until the title is edited.
+        """
+        return (not self._state.adding and getattr(self, '_loaded_title_hash', '') is None
+                and self.title == getattr(self, '_loaded_title', None))
+
+    def clean(self):
+        super().clean()
+        if not self._unedited_repeat() and self._title_taken(minhash.title_hash(self.title)):
+            raise ValidationError({'title': "A puzzle with this title already exists."})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored level so the dashboard counters can follow level changes
+        instance._loaded_level = instance.__dict__.get('level')
+        instance._loaded_title = instance.__dict__.get('title')
+        instance._loaded_title_hash = instance.__dict__.get('title_hash')
+        return instance
+
     def save(self, *args, **kwargs):
         # Automatically set puzzle_type based on level
         if self.level == 'beginner':
             self.puzzle_type = 'mcq'
         else:
             self.puzzle_type = 'code'
+        self.set_fingerprint()
+        if self._unedited_repeat() and self._title_taken(self.title_hash):
+            # The original holds this hash; the repeat stays unhashed rather than renamed
+            self.title_hash = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'title', 'description'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'title_hash', 'signature'}
         super().save(*args, **kwargs)
+        self._loaded_title = self.title
+        self._loaded_title_hash = self.title_hash
 
     class Meta:
         ordering = ['level', '-created_at']
+        indexes = [
+            # The catalog order (model ordering plus id); serves the unfiltered index and its keyset pages
+            models.Index(fields=['level', '-created_at', '-id'], name='puzzle_catalog_idx'),
+            # The same order under the category and category-plus-level filters
+            models.Index(fields=['category', 'level', '-created_at', '-id'], name='puzzle_catalog_cat_idx'),
+        ]
+
+class SimilarityBucket(models.Model):
+    """One LSH band of a puzzle's MinHash signature.
+
+    Puzzles that share a bucket are near-duplicate candidates, so a lookup
+    reads a handful of indexed rows instead of every puzzle.
+    """
+    puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE, related_name='similarity_buckets')
+    bucket = models.BigIntegerField(db_index=True)
 
 class Submission(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('error', 'Error'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE)
     code = models.TextField(null=True, blank=True)  # Used for coding challenges
@@ -67,6 +143,10 @@ class Submission(models.Model):
     is_correct = models.BooleanField(default=False)
     feedback = models.JSONField(null=True, blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
+    # Grading queue state; coding submissions wait as 'pending' for the worker
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    queued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.puzzle.title}"
@@ -75,31 +155,372 @@ class Submission(models.Model):
         """Override save method to validate based on puzzle type."""
         if self.puzzle.puzzle_type == 'mcq':
             self.is_correct = self.answer == self.puzzle.solution
-        else:  # Coding challenge
-            # Simplified validation: compare answer with solution output
-            # Note: You might want to implement actual code execution here
-            self.is_correct = self.answer == self.puzzle.solution
+        # Coding challenges are graded by the sandbox or the LLM validator,
+        # which set is_correct before saving
         super().save(*args, **kwargs)
 
     class Meta:
         unique_together = ['user', 'puzzle']
         ordering = ['-submitted_at']
+        indexes = [
+            # Partial index backing the worker's "next pending job" lookup
+            models.Index(
+                fields=['queued_at'],
+                condition=models.Q(status='pending'),
+                name='puzzle_subm_pending_idx',
+            ),
+            # Keyset pagination of a user's history on the profile page
+            models.Index(fields=['user', '-submitted_at', '-id'], name='puzzle_subm_history_idx'),
+            # Latest submissions across all users (admin dashboard and submission list)
+            models.Index(fields=['-submitted_at', '-id'], name='puzzle_subm_recent_idx'),
+            # A user's correct submissions (profile totals, history summary); only solves are indexed
+            models.Index(
+                fields=['user', 'puzzle'],
+                condition=models.Q(is_correct=True),
+                name='puzzle_subm_solved_idx',
+            ),
+            # Stale 'running' submissions swept back into the queue
+            models.Index(
+                fields=['started_at'],
+                condition=models.Q(status='running'),
+                name='puzzle_subm_running_idx',
+            ),
+        ]
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)  # Fixed typo: on_dielete -> on_delete
     total_points = models.IntegerField(default=0)
     puzzles_solved = models.IntegerField(default=0)
     solved_puzzles = models.ManyToManyField(Puzzle, blank=True)
+    # Bit n set = puzzle n solved; mirrors solved_puzzles (see puzzle/solved_set.py)
+    solved_bitmap = models.BinaryField(default=b'', blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Leaderboard order; also used for keyset pagination
+            models.Index(fields=['-total_points', 'id'], name='puzzle_profile_rank_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        points_saved = update_fields is None or 'total_points' in update_fields
+        with transaction.atomic():
+            previous = None
+            if not adding and points_saved:
+                # Lock the row and move buckets from the points it holds, not the ones
+                # loaded into this instance: a stale copy would drift the bucket counts
+                stored = UserProfile.objects.filter(pk=self.pk)
+                if stored.update(total_points=F('total_points')):
+                    previous = stored.values_list('total_points', flat=True).get()
+            super().save(*args, **kwargs)
+            if adding:
+                ScoreBucket.adjust(self.total_points, 1)
+            elif previous is not None and previous != self.total_points:
+                ScoreBucket.move(previous, self.total_points)
+
+    def get_rank(self):
+        """Return the competition rank (1 = most points) of this profile."""
+        return ScoreBucket.rank_for(self.total_points)
+
     def update_profile(self):
-        """Utility method to update total points and puzzles solved."""
-        solved_submissions = Submission.objects.filter(user=self.user, is_correct=True)
-        self.total_points = sum(submission.puzzle.points for submission in solved_submissions)
-        self.puzzles_solved = solved_submissions.count()
-        self.save()
+        """Utility method to update total points and puzzles solved.
+
+        Counts the solved_puzzles rows, which record_solve uses as its award
+        guard; a submission's is_correct changes with every re-grade.
+        """
+        totals = UserProfile.solved_puzzles.through.objects.filter(userprofile_id=self.pk).aggregate(
+            points=Sum('puzzle__points'), solved=Count('puzzle_id')
+        )
+        self.total_points = totals['points'] or 0
+        self.puzzles_solved = totals['solved']
+        self.save(update_fields=['total_points', 'puzzles_solved'])
+
+class ScoreBucket(models.Model):
+    """Number of profiles holding each distinct points total.
+
+    Kept up to date as points change, so a rank is one plus the number of
+    profiles in higher buckets: an indexed range sum over the (small) set of
+    distinct scores instead of a count over every profile.
+    """
+    points = models.IntegerField(unique=True)
+    profiles = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.points} pts: {self.profiles}"
+
+    @classmethod
+    def adjust(cls, points, delta):
+        """Add delta profiles to the bucket for a points total."""
+        if cls.objects.filter(points=points).update(profiles=F('profiles') + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(points=points, profiles=delta)
+        except IntegrityError:
+            # Created concurrently; fall back to the increment
+            cls.objects.filter(points=points).update(profiles=F('profiles') + delta)
+
+    @classmethod
+    def move(cls, old_points, new_points):
+        if old_points != new_points:
+            cls.adjust(old_points, -1)
+            cls.adjust(new_points, 1)
+
+    @classmethod
+    def rank_for(cls, points):
+        above = cls.objects.filter(points__gt=points).aggregate(total=Sum('profiles'))['total']
+        return (above or 0) + 1
+
+    @classmethod
+    def rebuild(cls):
+        """Recount every bucket from the profile table."""
+        counts = (UserProfile.objects.order_by()
+                  .values('total_points')
+                  .annotate(profiles=Count('id')))
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(points=row['total_points'], profiles=row['profiles']) for row in counts],
+                batch_size=1000,
+            )
+
+class VerdictCacheEntry(models.Model):
+    """Persistent tier of the LLM verdict cache, keyed by puzzle and normalized code."""
+    key = models.CharField(max_length=64, unique=True)
+    verdict = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+class CodeDraft(models.Model):
+    """A user's last submitted code for a coding puzzle, zlib-compressed (see puzzle.drafts)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE)
+    data = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'puzzle']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.puzzle_id}"
+
+class SiteStats(models.Model):
+    """Single-row snapshot of the admin dashboard figures.
+
+    Counters are incremented by signals as rows are created and deleted; the
+    30-day rollups are rebuilt from DailyActivity/DailySolverActivity at most
+    once a minute when the dashboard is read.
+    """
+    SNAPSHOT_ID = 1
+    LEVEL_FIELDS = {
+        'beginner': 'beginner_puzzles',
+        'intermediate': 'intermediate_puzzles',
+        'expert': 'expert_puzzles',
+    }
+
+    total_users = models.IntegerField(default=0)
+    total_puzzles = models.IntegerField(default=0)
+    total_submissions = models.IntegerField(default=0)
+    beginner_puzzles = models.IntegerField(default=0)
+    intermediate_puzzles = models.IntegerField(default=0)
+    expert_puzzles = models.IntegerField(default=0)
+    top_solvers = models.JSONField(default=list)  # [{"username": ..., "solved": ...}]
+    submissions_per_day = models.JSONField(default=list)  # [{"day": "YYYY-MM-DD", "submissions": ..., "solves": ...}]
+    rollups_refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'site stats'
+
+    @classmethod
+    def increment(cls, **deltas):
+        """Atomically add deltas to snapshot counters (no-op until the snapshot is built)."""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas:
+            cls.objects.filter(pk=cls.SNAPSHOT_ID).update(
+                **{field: F(field) + delta for field, delta in deltas.items()}
+            )
+
+class UsernameCounter(models.Model):
+    """The last numeric suffix handed out for each signup username base.
+
+    Signup usernames are first.last, then first.last1, first.last2 and so on;
+    the counter replaces probing each candidate with its own query.
+    """
+    base = models.CharField(max_length=150, unique=True)
+    last_suffix = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.base}: {self.last_suffix}"
+
+    @classmethod
+    def allocate(cls, base):
+        """Reserve the next username for base: base itself, then base1, base2, ..."""
+        with transaction.atomic():
+            if cls.objects.filter(base=base).update(last_suffix=F('last_suffix') + 1):
+                # The row stays locked by our update until commit, so the value read is ours
+                suffix = cls.objects.filter(base=base).values_list('last_suffix', flat=True).get()
+            else:
+                suffix = cls._first_free_suffix(base)
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(base=base, last_suffix=suffix)
+                except IntegrityError:
+                    # Created concurrently; take the next suffix from it instead
+                    cls.objects.filter(base=base).update(last_suffix=F('last_suffix') + 1)
+                    suffix = cls.objects.filter(base=base).values_list('last_suffix', flat=True).get()
+        return f"{base}{suffix}" if suffix else base
+
+    @classmethod
+    def _first_free_suffix(cls, base):
+        """Start a new counter above the usernames already taken for base.
+
+        base and base<digits> all sort between base and base + ':' (the
+        character after '9'), so this is one range scan of the username index.
+        """
+        taken = User.objects.filter(username__gte=base, username__lt=f"{base}:").values_list('username', flat=True)
+        suffixes = [-1]
+        for username in taken:
+            rest = username[len(base):]
+            if not rest:
+                suffixes.append(0)
+            elif rest.isdigit():
+                suffixes.append(int(rest))
+        return max(suffixes) + 1
+
+class DailyActivity(models.Model):
+    """Submissions and solves per day, maintained incrementally for the dashboard."""
+    day = models.DateField(unique=True)
+    submissions = models.IntegerField(default=0)
+    solves = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily activity'
+
+    @classmethod
+    def bump(cls, day, submissions=0, solves=0):
+        changes = {'submissions': F('submissions') + submissions, 'solves': F('solves') + solves}
+        if cls.objects.filter(day=day).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(day=day, submissions=submissions, solves=solves)
+        except IntegrityError:
+            cls.objects.filter(day=day).update(**changes)
+
+class DailySolverActivity(models.Model):
+    """Puzzles solved per user per day; the source of the 30-day top solvers."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    solves = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'day']
+        indexes = [
+            models.Index(fields=['day'], name='puzzle_solver_day_idx'),
+        ]
+        verbose_name_plural = 'daily solver activity'
+
+    @classmethod
+    def bump(cls, user_id, day):
+        if cls.objects.filter(user_id=user_id, day=day).update(solves=F('solves') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, day=day, solves=1)
+        except IntegrityError:
+            cls.objects.filter(user_id=user_id, day=day).update(solves=F('solves') + 1)
+
+class GenerationJob(models.Model):
+    """An admin request to generate a batch of puzzles, split into LLM-sized chunks.
+
+    Chunk state lives in ``chunks`` so a retry reruns only the chunks that
+    did not finish.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    category = models.CharField(max_length=2, choices=Puzzle.CATEGORIES, default='PY')
+    level = models.CharField(max_length=20, choices=Puzzle.LEVEL_CHOICES, default='beginner')
+    requested = models.IntegerField()
+    created_count = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # [{"index": 0, "size": 5, "status": "pending|running|done|failed", "created": 0, "attempts": 0, "error": ""}]
+    chunks = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.requested} {self.level} {self.category} puzzles ({self.status})"
+
+    @property
+    def failed_chunks(self):
+        return [chunk for chunk in self.chunks if chunk['status'] == 'failed']
+
+    @property
+    def progress(self):
+        """Percentage of chunks that have finished, successfully or not."""
+        if not self.chunks:
+            return 0
+        finished = sum(1 for chunk in self.chunks if chunk['status'] in ('done', 'failed'))
+        return round(100 * finished / len(self.chunks))
+
+class AttemptRecord(models.Model):
+    """Fields shared by the attempt log and its archive."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE, related_name='+')
+    answer = models.CharField(max_length=500, null=True, blank=True)
+    code = models.TextField(null=True, blank=True)
+    is_correct = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=Submission.STATUS_CHOICES)
+    verdict = models.JSONField(null=True, blank=True)
+    engine = models.CharField(max_length=20, blank=True)  # mcq, sandbox or llm
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)  # grading time
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.user_id} - {self.puzzle_id} @ {self.created_at:%Y-%m-%d %H:%M}"
+
+class Attempt(AttemptRecord):
+    """Append-only log of every graded attempt; Submission keeps only the latest state.
+
+    Rows older than the retention window are moved to ArchivedAttempt by the
+    ``archive_attempts`` command.
+    """
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='puzzle_attempt_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='puzzle_attempt_user_idx'),
+        ]
+
+class ArchivedAttempt(AttemptRecord):
+    """Attempts moved out of the hot log; keeps the original Attempt id."""
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='puzzle_archived_created_idx'),
+        ]
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -107,7 +528,73 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save the UserProfile instance after a user is saved."""
-    instance.userprofile.save()
\ No newline at end of file
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+def invalidate_puzzle_index(sender, instance, **kwargs):
+    """Drop cached puzzle index pages when a puzzle is added, edited or removed."""
+    from .catalog import bump_version
+    # After commit: bumped earlier, a concurrent reader could cache the old rows under the new version
+    transaction.on_commit(bump_version)
+
+@receiver(post_save, sender=Puzzle)
+@receiver(post_delete, sender=Puzzle)
+def invalidate_puzzle_content(sender, instance, **kwargs):
+    """Retire the cached detail/solve content of a puzzle that was edited or removed."""
+    from . import content_cache
+    puzzle_id = instance.pk  # delete() clears instance.pk before the commit
+    transaction.on_commit(lambda: content_cache.bump_version(puzzle_id))
+
+@receiver(post_save, sender=Puzzle)
+def index_puzzle_signature(sender, instance, created, update_fields=None, **kwargs):
+    """Refresh the near-duplicate buckets of a puzzle saved one at a time."""
+    if update_fields is not None and 'signature' not in update_fields:
+        return
+    from . import dedupe
+    dedupe.index_puzzles([instance], replace=not created)
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_score_bucket(sender, instance, **kwargs):
+    """Keep the rank index in step when a profile is deleted."""
+    ScoreBucket.adjust(instance.total_points, -1)
+
+@receiver(post_save, sender=UserProfile)
+def count_new_profile(sender, instance, created, **kwargs):
+    if created:
+        SiteStats.increment(total_users=1)
+
+@receiver(post_delete, sender=UserProfile)
+def count_deleted_profile(sender, instance, **kwargs):
+    SiteStats.increment(total_users=-1)
+
+@receiver(post_save, sender=Puzzle)
+def count_puzzle_change(sender, instance, created, **kwargs):
+    """Keep the dashboard's puzzle totals and per-level counts in step."""
+    new_field = SiteStats.LEVEL_FIELDS.get(instance.level)
+    if created:
+        deltas = {'total_puzzles': 1}
+        if new_field:
+            deltas[new_field] = 1
+        SiteStats.increment(**deltas)
+    else:
+        old_field = SiteStats.LEVEL_FIELDS.get(getattr(instance, '_loaded_level', None))
+        if old_field and new_field and old_field != new_field:
+            SiteStats.increment(**{old_field: -1, new_field: 1})
+    instance._loaded_level = instance.level
+
+@receiver(post_delete, sender=Puzzle)
+def count_deleted_puzzle(sender, instance, **kwargs):
+    deltas = {'total_puzzles': -1}
+    level_field = SiteStats.LEVEL_FIELDS.get(instance.level)
+    if level_field:
+        deltas[level_field] = -1
+    SiteStats.increment(**deltas)
+
+@receiver(post_save, sender=Submission)
+def count_new_submission(sender, instance, created, **kwargs):
+    if created:
+        SiteStats.increment(total_submissions=1)
+        DailyActivity.bump(timezone.localdate(instance.submitted_at), submissions=1)
+
+@receiver(post_delete, sender=Submission)
+def count_deleted_submission(sender, instance, **kwargs):
+    SiteStats.increment(total_submissions=-1)
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""Leaderboard queries built on the (-total_points, id) index and ScoreBucket ranks."""
+from django.db.models import F, Func, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ScoreBucket, UserProfile
+
+PAGE_SIZE = 25
+AROUND_ME = 5
+
+
+def leaderboard_queryset():
+    return (UserProfile.objects
+            .select_related('user')
+            .only('id', 'total_points', 'puzzles_solved', 'user__username'))
+
+
+def _after(points, profile_id):
+    """Profiles ranked below (points, id) in leaderboard order."""
+    return Q(total_points__lt=points) | Q(total_points=points, id__gt=profile_id)
+
+
+def _before(points, profile_id):
+    """Profiles ranked above (points, id) in leaderboard order."""
+    return Q(total_points__gt=points) | Q(total_points=points, id__lt=profile_id)
+
+
+def attach_ranks(profiles):
+    """Set profile.rank on each profile with a single query over the score buckets.
+
+    Reads every non-empty bucket above the lowest profile's score, so the cost
+    is O(distinct scores), not O(profiles).
+    """
+    if not profiles:
+        return profiles
+    lowest = min(profile.total_points for profile in profiles)
+    buckets = (ScoreBucket.objects
+               .filter(points__gt=lowest, profiles__gt=0)
+               .order_by('-points')
+               .values_list('points', 'profiles'))
+    above = {}
+    running = 0
+    for points, count in buckets:
+        above[points] = running
+        running += count
+    # above[p] = profiles strictly above bucket p; the lowest bucket sits under all of them
+    for profile in profiles:
+        profile.rank = above.get(profile.total_points, running) + 1
+    return profiles
+
+
+def with_rank(queryset):
+    """Annotate each profile's competition rank from the score buckets, in the same query.
+
+    Each rank sums the buckets above the profile's score: O(distinct scores) per row.
+    """
+    above = (ScoreBucket.objects
+             .filter(points__gt=OuterRef('total_points'))
+             .order_by()
+             .values(total=Func(F('profiles'), function='SUM')))
+    return queryset.annotate(rank=Coalesce(Subquery(above), Value(0)) + 1)
+
+
+def get_page(after=None, before=None, page_size=PAGE_SIZE):
+    """Return one keyset-paginated leaderboard page.
+
+    after/before are (points, id) of the last/first row of the neighbouring
+    page. The result holds the rows plus whether more rows exist either side.
+    """
+    queryset = leaderboard_queryset()
+    if before is not None:
+        rows = list(queryset.filter(_before(*before))
+                    .order_by('total_points', '-id')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(_after(*after))
+        rows = list(queryset.order_by('-total_points', 'id')[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+    return {
+        'rows': attach_ranks(rows),
+        'has_next': has_next and bool(rows),
+        'has_previous': has_previous and bool(rows),
+    }
+
+
+def around(profile, radius=AROUND_ME):
+    """Return the profiles immediately above and below the given one, including it."""
+    key = (profile.total_points, profile.id)
+    above = list(leaderboard_queryset().filter(_before(*key))
+                 .order_by('total_points', '-id')[:radius])[::-1]
+    below = list(leaderboard_queryset().filter(_after(*key))
+                 .order_by('-total_points', 'id')[:radius])
+    return attach_ranks(above + [profile] + below)
+
+
+def cursor_key(profile):
+    return [profile.total_points, profile.id]
+
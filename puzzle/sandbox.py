@@ -0,0 +1,300 @@
+"""Sandboxed execution engine for grading coding puzzles against their test cases.
+
+Every test case runs in a fresh ``python -I -S`` interpreter (see
+puzzle.sandbox_runner) that, before the submission runs, moves into its own
+mount and network namespaces, hides the project directory behind an empty
+tmpfs, applies CPU, memory, file size and process rlimits and switches to an
+unprivileged user. It cannot reach the network, read the settings or the
+database, fork, or signal this process, and the expected output stays here.
+Setting that up needs Linux and root (or CAP_SYS_ADMIN and CAP_SETUID);
+available() probes for it once, and grading falls back to the LLM validator
+where it is missing. The interpreter runs as the unprivileged user, so it and
+its standard library must be readable by that user: a virtualenv or pyenv
+build under /root is not, hence the system python3 default.
+"""
+import inspect
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+
+try:
+    import pwd
+except ImportError:  # Windows: no sandbox user, grading uses the LLM
+    pwd = None
+
+from . import sandbox_runner
+from .sandbox_runner import literal as _literal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    'WORKERS': 2,
+    'CPU_SECONDS': 2,
+    'MEMORY_MB': 256,
+    'WALL_SECONDS': 5,
+    'MAX_OUTPUT_CHARS': 2000,
+    'USER': 'nobody',
+    'PYTHON': '/usr/bin/python3',
+    'HIDDEN_PATHS': None,
+}
+
+RUNNER_SOURCE = inspect.getsource(sandbox_runner)
+
+# Checked once per interpreter and user before the sandbox is trusted with grading
+PROBE = ('import math\nprint(math.isqrt(int(input())))', '16', '4')
+
+
+class SandboxUnavailable(Exception):
+    """The isolated child could not be set up on this host."""
+
+
+def get_limits():
+    """Return sandbox limits, with settings.PUZZLE_SANDBOX overriding the defaults."""
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(getattr(settings, 'PUZZLE_SANDBOX', {}))
+    if limits['HIDDEN_PATHS'] is None:
+        limits['HIDDEN_PATHS'] = [settings.BASE_DIR]
+    return limits
+
+
+def extract_test_cases(test_cases):
+    """Return a list of (name, input, expected_output) tuples from Puzzle.test_cases.
+
+    Both the generated dict format ({"test1": {"input": ..., "output": ...}})
+    and a plain list of input/output dicts are accepted. Anything else (e.g.
+    MCQ options) yields an empty list.
+    """
+    if isinstance(test_cases, dict):
+        items = test_cases.items()
+    elif isinstance(test_cases, list):
+        items = ((f'test{i}', case) for i, case in enumerate(test_cases, start=1))
+    else:
+        return []
+
+    cases = []
+    for name, case in items:
+        if isinstance(case, dict) and 'input' in case and 'output' in case:
+            cases.append((str(name), case['input'], case['output']))
+    return cases
+
+
+def has_test_cases(test_cases):
+    """Return True if the puzzle has input/output pairs the sandbox can run."""
+    return bool(extract_test_cases(test_cases))
+
+
+def outputs_match(actual, expected):
+    """Compare a program result with the expected output, tolerating formatting differences."""
+    if not isinstance(actual, str):
+        if actual == _literal(expected):
+            return True
+        actual = str(actual)
+    if str(actual).strip() == str(expected).strip():
+        return True
+    parsed_actual = _literal(actual)
+    parsed_expected = _literal(expected)
+    if parsed_actual is actual or parsed_expected is expected:
+        # At least one side is not a literal; the plain text comparison was authoritative
+        return False
+    return parsed_actual == parsed_expected
+
+
+def _isolation(limits):
+    if pwd is None:
+        raise SandboxUnavailable("The sandbox needs a POSIX system")
+    try:
+        user = pwd.getpwnam(limits['USER'])
+    except KeyError:
+        raise SandboxUnavailable(f"Sandbox user {limits['USER']!r} does not exist")
+    return {
+        'uid': user.pw_uid,
+        'gid': user.pw_gid,
+        'hidden': [str(path) for path in limits['HIDDEN_PATHS'] if os.path.isdir(path)],
+        'cpu_seconds': limits['CPU_SECONDS'],
+        'memory_mb': limits['MEMORY_MB'],
+    }
+
+
+def _run_isolated(code, test_input, limits):
+    """Run the submission for one test input in a new isolated interpreter.
+
+    Returns {'actual', 'repr', 'error'} as reported by the runner, or with
+    only 'error' set when the child was killed or produced no result.
+    """
+    job = json.dumps({'code': code, 'input': test_input, 'isolation': _isolation(limits)}).encode()
+    # Output goes to a file so RLIMIT_FSIZE caps it; the cwd is empty and not writable
+    with tempfile.TemporaryDirectory(prefix='sandbox-') as cwd, tempfile.TemporaryFile() as output:
+        os.chmod(cwd, 0o755)
+        process = subprocess.Popen(
+            [limits['PYTHON'], '-I', '-S', '-c', RUNNER_SOURCE],
+            stdin=subprocess.PIPE, stdout=output, stderr=subprocess.DEVNULL,
+            cwd=cwd, env={}, start_new_session=True,
+        )
+        try:
+            process.communicate(job, timeout=limits['WALL_SECONDS'])
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            return {'error': 'Wall clock limit exceeded'}
+        output.seek(0)
+        data = output.read()
+
+    try:
+        result = json.loads(data) if data else None
+    except ValueError:
+        result = None
+    if process.returncode == sandbox_runner.ISOLATION_FAILED and result and 'isolation_error' in result:
+        raise SandboxUnavailable(result['isolation_error'])
+    if process.returncode == 0 and isinstance(result, dict) and 'actual' in result:
+        return result
+    if process.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        return {'error': 'CPU time limit exceeded'}
+    if process.returncode == sandbox_runner.OUTPUT_TOO_LARGE:
+        return {'error': 'Output limit exceeded'}
+    return {'error': 'Submission crashed without producing a result'}
+
+
+def _check(result, expected, limits):
+    """Turn the runner's report into a per-test verdict."""
+    if result.get('error'):
+        return {'passed': False, 'actual': None, 'error': result['error']}
+    actual = result['actual']
+    shown = actual
+    if result.get('repr') is not None:
+        shown = result['repr']
+        value = _literal(shown)
+        if value is not shown:
+            actual = value
+    return {
+        'passed': outputs_match(actual, expected),
+        'actual': shown[:limits['MAX_OUTPUT_CHARS']],
+        'error': None,
+    }
+
+
+_slots = None
+_slots_lock = threading.Lock()
+_probes = {}
+
+
+def _get_slots(limits):
+    """Semaphore bounding how many sandboxed interpreters run at once."""
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(limits['WORKERS'])
+    return _slots
+
+
+def run_test(code, test_input, expected, limits=None):
+    """Run one test case in the sandbox and return {'passed', 'actual', 'error'}."""
+    limits = limits or get_limits()
+    with _get_slots(limits):
+        return _check(_run_isolated(code, test_input, limits), expected, limits)
+
+
+def available():
+    """Whether isolated children can be started here; checked once per interpreter and user."""
+    limits = get_limits()
+    key = (limits['PYTHON'], limits['USER'])
+    if key not in _probes:
+        if not sys.platform.startswith('linux'):
+            ok, reason = False, "needs Linux namespaces"
+        else:
+            try:
+                outcome = run_test(*PROBE, limits=limits)
+                ok, reason = outcome['passed'], outcome['error']
+            except (SandboxUnavailable, OSError) as e:
+                ok, reason = False, str(e)
+        if not ok:
+            logger.error(f"Sandbox unavailable ({reason}); coding puzzles will be graded by the LLM")
+        _probes[key] = ok
+    return _probes[key]
+
+
+def check_interpreter(app_configs, **kwargs):
+    """System check: the sandbox interpreter must exist and be reachable by other users."""
+    if pwd is None or not sys.platform.startswith('linux'):
+        return []
+    python = get_limits()['PYTHON']
+    hint = "Set PUZZLE_SANDBOX['PYTHON'] to a system interpreter such as /usr/bin/python3."
+    if not os.path.isfile(python):
+        return [checks.Warning(f"Sandbox interpreter {python!r} does not exist", hint=hint, id='puzzle.W001')]
+    # Submissions run as an unprivileged user, which must be able to execute the
+    # interpreter and enter every directory above it
+    path = os.path.realpath(python)
+    while True:
+        if not os.stat(path).st_mode & 0o001:
+            return [checks.Warning(
+                f"Sandbox interpreter {python!r} is not usable by other users ({path!r} lacks o+x); "
+                "coding puzzles will be graded by the LLM",
+                hint=hint, id='puzzle.W002',
+            )]
+        if path == os.path.dirname(path):
+            return []
+        path = os.path.dirname(path)
+
+
+def grade(code, test_cases):
+    """Grade submitted code against Puzzle.test_cases.
+
+    Returns a verdict dict using the same is_valid/message/errors keys as the
+    LLM validator, plus a per-test breakdown under 'tests'. Raises
+    SandboxUnavailable if the isolated child cannot be started.
+    """
+    tests = extract_test_cases(test_cases)
+    started = time.perf_counter()
+    if not tests:
+        # Nothing to check the code against; never a pass
+        return {
+            'is_valid': False,
+            'message': "This puzzle has no runnable test cases.",
+            'errors': ["No test cases"],
+            'tests': [],
+            'engine': 'sandbox',
+            'duration_ms': 0.0,
+        }
+    try:
+        compile(code, '<submission>', 'exec')
+    except SyntaxError as e:
+        return {
+            'is_valid': False,
+            'message': f"Syntax error on line {e.lineno}: {e.msg}",
+            'errors': [f"SyntaxError: {e.msg}"],
+            'tests': [],
+            'engine': 'sandbox',
+            'duration_ms': 0.0,
+        }
+
+    limits = get_limits()
+    results = []
+    for name, test_input, expected in tests:
+        test_started = time.perf_counter()
+        outcome = run_test(code, test_input, expected, limits)
+        outcome.update({
+            'name': name,
+            'input': test_input,
+            'expected': expected,
+            'duration_ms': round((time.perf_counter() - test_started) * 1000, 2),
+        })
+        results.append(outcome)
+    passed = sum(1 for result in results if result['passed'])
+    errors = [f"{result['name']}: {result['error']}" for result in results if result['error']]
+    return {
+        'is_valid': passed == len(results),
+        'message': f"Passed {passed} of {len(results)} test cases.",
+        'errors': errors,
+        'tests': results,
+        'engine': 'sandbox',
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
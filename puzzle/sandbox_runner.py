@@ -0,0 +1,162 @@
+"""Runs one test case of a submission inside the sandbox.
+
+puzzle.sandbox starts a fresh ``python -I -S -c <this file's source>`` for
+every test case and sends the job as JSON on stdin. Before the submitted code
+is compiled, this script enters new mount and network namespaces, covers the
+hidden directories (the project, with its settings and database) with empty
+read-only tmpfs mounts, applies the rlimits and switches to the unprivileged
+sandbox user. It then runs the code and writes what it printed or returned to
+stdout as JSON. The expected output is never sent here; puzzle.sandbox does
+the comparison.
+
+Only the standard library may be used: the child interpreter runs isolated,
+without site-packages or the project on its path.
+"""
+import ast
+import ctypes
+import io
+import json
+import os
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+
+ENTRY_POINT_NAMES = ('solution', 'solve', 'main')
+
+# Exit statuses besides 0: the sandbox could not be set up, or the result was over MAX_FILE_BYTES
+ISOLATION_FAILED = 3
+OUTPUT_TOO_LARGE = 4
+# Bytes the child may write to a file, its result included
+MAX_FILE_BYTES = 1024 * 1024
+
+# From <sched.h> and <sys/mount.h>
+CLONE_NEWNS = 0x00020000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+
+
+def literal(value):
+    """Parse a Python literal from a test case value, falling back to the raw value."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return ast.literal_eval(value.strip())
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return value
+
+
+def as_stdin(value):
+    if isinstance(value, str):
+        return value if value.endswith('\n') else value + '\n'
+    return json.dumps(value) + '\n'
+
+
+def entry_point(code, namespace):
+    """Find the function to call when the submission defines one instead of printing."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    names = [node.name for node in tree.body
+             if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    for name in ENTRY_POINT_NAMES:
+        if name in names:
+            return namespace.get(name)
+    if len(names) == 1:
+        return namespace.get(names[0])
+    return None
+
+
+def isolate(config):
+    """Cut the process off from the network and the project, limit it and drop root."""
+    import resource
+
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    def check(result, action):
+        if result != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"{action}: {os.strerror(errno)}")
+
+    check(libc.unshare(CLONE_NEWNS | CLONE_NEWNET), "unshare")
+    # Keep the mounts below out of the parent's namespace
+    check(libc.mount(b'none', b'/', None, MS_REC | MS_PRIVATE, None), "make / private")
+    for path in config['hidden']:
+        check(libc.mount(b'tmpfs', os.fsencode(path), b'tmpfs',
+                         MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC, b'size=4k,mode=0555'),
+              f"hide {path}")
+
+    cpu = int(config['cpu_seconds'])
+    memory = int(config['memory_mb']) * 1024 * 1024
+    for limit, value in (
+        (resource.RLIMIT_CPU, (cpu, cpu + 1)),
+        (resource.RLIMIT_AS, (memory, memory)),
+        (resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES)),
+        (resource.RLIMIT_NPROC, (0, 0)),   # enforced once we are no longer root
+        (resource.RLIMIT_CORE, (0, 0)),
+    ):
+        resource.setrlimit(limit, value)
+
+    os.setgroups([])
+    os.setgid(config['gid'])
+    os.setuid(config['uid'])
+    if 0 in (os.getuid(), os.geteuid(), os.getgid(), os.getegid()):
+        raise OSError("sandbox user must not be root")
+
+
+def run(code, test_input):
+    """Execute the submission once and return what it printed or returned."""
+    stdout = io.StringIO()
+    namespace = {'__name__': '__main__'}
+    result = {'actual': None, 'repr': None, 'error': None}
+    sys.stdin = io.StringIO(as_stdin(test_input))
+    try:
+        with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+            try:
+                exec(compile(code, '<submission>', 'exec'), namespace)
+                actual = stdout.getvalue()
+                if not actual.strip():
+                    func = entry_point(code, namespace)
+                    if func is not None:
+                        args = literal(test_input)
+                        actual = func(*args) if isinstance(args, tuple) else func(args)
+                        printed = stdout.getvalue()
+                        if actual is None and printed.strip():
+                            actual = printed
+            except SystemExit:
+                actual = stdout.getvalue()
+        if isinstance(actual, str):
+            result['actual'] = actual
+        else:
+            # The parent compares the value itself when its repr parses back as a literal
+            result['actual'] = str(actual)
+            result['repr'] = repr(actual)
+    except MemoryError:
+        result = {'actual': None, 'repr': None, 'error': 'Memory limit exceeded'}
+    except BaseException as e:  # user code may raise anything
+        result = {'actual': None, 'repr': None, 'error': f"{type(e).__name__}: {e}"}
+    return result
+
+
+def main():
+    job = json.loads(sys.stdin.buffer.read())
+    try:
+        isolate(job['isolation'])
+    except Exception as e:
+        os.write(1, json.dumps({'isolation_error': str(e)}).encode())
+        os._exit(ISOLATION_FAILED)
+    payload = json.dumps(run(job['code'], job['input'])).encode()
+    if len(payload) > MAX_FILE_BYTES:
+        # RLIMIT_FSIZE would only cut the write short (Python ignores SIGXFSZ)
+        os._exit(OUTPUT_TOO_LARGE)
+    while payload:
+        payload = payload[os.write(1, payload):]
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
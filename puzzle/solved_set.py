@@ -0,0 +1,109 @@
+"""Per-user solved-puzzle bitmaps for O(1) "is solved" checks.
+
+Bit ``n`` of UserProfile.solved_bitmap is set once the user has solved the
+puzzle with primary key ``n``. record_solve sets the bit in the same
+transaction that inserts the solved_puzzles row, so the bitmap is a compact
+mirror of the M2M table that pages can test without querying it. Lookups by
+profile id go through the cache before the database.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserProfile
+
+CACHE_TIMEOUT = 3600
+
+
+class SolvedSet:
+    __slots__ = ('bits',)
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data or b'')
+
+    def __contains__(self, puzzle_id):
+        byte = puzzle_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (puzzle_id & 7)))
+
+    def __len__(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+    def __iter__(self):
+        for byte_index, byte in enumerate(self.bits):
+            while byte:
+                low = byte & -byte
+                yield byte_index * 8 + low.bit_length() - 1
+                byte ^= low
+
+    def add(self, puzzle_id):
+        byte = puzzle_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (puzzle_id & 7)
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    @classmethod
+    def from_ids(cls, puzzle_ids):
+        solved = cls()
+        for puzzle_id in puzzle_ids:
+            solved.add(puzzle_id)
+        return solved
+
+
+def cache_key(profile_id):
+    return f'solved_set:{profile_id}'
+
+
+def for_profile(profile):
+    """The solved set of a loaded profile (no query unless solved_bitmap was deferred)."""
+    return SolvedSet(profile.solved_bitmap)
+
+
+def for_profile_id(profile_id):
+    """The solved set of a profile by id, from the cache or its stored bitmap."""
+    data = cache.get(cache_key(profile_id))
+    if data is None:
+        data = (UserProfile.objects.filter(pk=profile_id)
+                .values_list('solved_bitmap', flat=True).first()) or b''
+        data = bytes(data)
+        cache.set(cache_key(profile_id), data, CACHE_TIMEOUT)
+    return SolvedSet(data)
+
+
+def add_locked(profile_id, puzzle_id, current):
+    """Set a puzzle's bit on a profile whose row the caller has locked in a transaction.
+
+    ``current`` is the stored bitmap, read after the lock was taken.
+    """
+    solved = SolvedSet(current)
+    solved.add(puzzle_id)
+    data = solved.to_bytes()
+    UserProfile.objects.filter(pk=profile_id).update(solved_bitmap=data)
+    transaction.on_commit(lambda: cache.set(cache_key(profile_id), data, CACHE_TIMEOUT))
+    return data
+
+
+def rebuild(profile_ids=None):
+    """Recompute bitmaps from the solved_puzzles table; returns the number of profiles changed."""
+    through = UserProfile.solved_puzzles.through
+    profiles = UserProfile.objects.only('pk', 'solved_bitmap')
+    if profile_ids is not None:
+        profiles = profiles.filter(pk__in=profile_ids)
+    solved_ids = {}
+    pairs = through.objects.values_list('userprofile_id', 'puzzle_id')
+    if profile_ids is not None:
+        pairs = pairs.filter(userprofile_id__in=profile_ids)
+    for profile_id, puzzle_id in pairs.iterator():
+        solved_ids.setdefault(profile_id, []).append(puzzle_id)
+
+    changed = []
+    for profile in profiles:
+        data = SolvedSet.from_ids(solved_ids.get(profile.pk, ())).to_bytes()
+        if bytes(profile.solved_bitmap or b'') != data:
+            profile.solved_bitmap = data
+            changed.append(profile)
+    if changed:
+        UserProfile.objects.bulk_update(changed, ['solved_bitmap'], batch_size=1000)
+        cache.delete_many([cache_key(profile.pk) for profile in changed])
+    return len(changed)
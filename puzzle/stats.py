@@ -0,0 +1,92 @@
+"""Dashboard statistics snapshot: read, rollup refresh and full rebuild."""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (DailyActivity, DailySolverActivity, Puzzle, SiteStats,
+                     Submission, UserProfile)
+
+WINDOW_DAYS = 30
+TOP_SOLVERS = 5
+ROLLUP_TTL = timedelta(seconds=60)
+
+
+def record_solve(user_id):
+    """Count a first-time solve towards today's activity and the top-solver window."""
+    today = timezone.localdate()
+    DailyActivity.bump(today, solves=1)
+    DailySolverActivity.bump(user_id, today)
+
+
+def get_snapshot():
+    """Return the dashboard snapshot, building it or refreshing stale rollups as needed."""
+    snapshot = SiteStats.objects.filter(pk=SiteStats.SNAPSHOT_ID).first()
+    if snapshot is None:
+        return rebuild()
+    refreshed = snapshot.rollups_refreshed_at
+    if refreshed is None or timezone.now() - refreshed > ROLLUP_TTL:
+        refresh_rollups(snapshot)
+    return snapshot
+
+
+def refresh_rollups(snapshot):
+    """Recompute the 30-day top solvers and per-day activity from the rollup tables."""
+    since = timezone.localdate() - timedelta(days=WINDOW_DAYS - 1)
+    top = (DailySolverActivity.objects.filter(day__gte=since)
+           .values('user__username')
+           .annotate(solved=Sum('solves'))
+           .order_by('-solved', 'user__username')[:TOP_SOLVERS])
+    snapshot.top_solvers = [
+        {'username': row['user__username'], 'solved': row['solved']} for row in top
+    ]
+    snapshot.submissions_per_day = [
+        {'day': row['day'].isoformat(), 'submissions': row['submissions'], 'solves': row['solves']}
+        for row in DailyActivity.objects.filter(day__gte=since).order_by('day')
+        .values('day', 'submissions', 'solves')
+    ]
+    snapshot.rollups_refreshed_at = timezone.now()
+    snapshot.save(update_fields=['top_solvers', 'submissions_per_day', 'rollups_refreshed_at'])
+    return snapshot
+
+
+def rebuild():
+    """Recount everything from the source tables (initial build or drift repair)."""
+    levels = dict(Puzzle.objects.order_by().values_list('level').annotate(total=Count('id')))
+    since = timezone.localdate() - timedelta(days=WINDOW_DAYS - 1)
+
+    with transaction.atomic():
+        # Rebuild the rollup window; submitted_at is the first-attempt time, so this is approximate
+        DailyActivity.objects.filter(day__gte=since).delete()
+        daily = (Submission.objects.filter(submitted_at__date__gte=since)
+                 .annotate(day=TruncDate('submitted_at'))
+                 .order_by()
+                 .values('day')
+                 .annotate(submissions=Count('id'), solves=Count('id', filter=Q(is_correct=True))))
+        DailyActivity.objects.bulk_create([DailyActivity(**row) for row in daily])
+
+        DailySolverActivity.objects.filter(day__gte=since).delete()
+        solver_days = (Submission.objects.filter(submitted_at__date__gte=since, is_correct=True)
+                       .annotate(day=TruncDate('submitted_at'))
+                       .order_by()
+                       .values('user_id', 'day')
+                       .annotate(solves=Count('id')))
+        DailySolverActivity.objects.bulk_create(
+            [DailySolverActivity(**row) for row in solver_days], batch_size=1000
+        )
+
+        snapshot, _ = SiteStats.objects.update_or_create(
+            pk=SiteStats.SNAPSHOT_ID,
+            defaults={
+                'total_users': UserProfile.objects.count(),
+                'total_puzzles': sum(levels.values()),
+                'total_submissions': Submission.objects.count(),
+                'beginner_puzzles': levels.get('beginner', 0),
+                'intermediate_puzzles': levels.get('intermediate', 0),
+                'expert_puzzles': levels.get('expert', 0),
+            },
+        )
+    return refresh_rollups(snapshot)
+
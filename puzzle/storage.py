@@ -0,0 +1,69 @@
+"""Static files storage that fingerprints and precompresses assets at collectstatic time.
+
+Every collected file gets a content-hashed copy (via ManifestStaticFilesStorage),
+and each hashed text asset also gets a gzip variant, plus a brotli one when
+the optional ``brotli`` package is installed. StaticAssetMiddleware serves
+the variants with far-future cache headers.
+"""
+import gzip
+import logging
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+MIN_SIZE = 256          # bytes; smaller files aren't worth a variant
+MAX_RATIO = 0.95        # keep a variant only if it saves at least 5%
+
+
+def encoders():
+    """(encoding, suffix, compress) for each variant this process can write."""
+    variants = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Assets referenced by templates but missing from the manifest (not collected,
+    # or not in the project at all) render unhashed instead of failing the page
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        written = 0
+        for name in set(self.hashed_files.values()):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                written += self.compress(name)
+        logger.info(f"Wrote {written} compressed static variants")
+
+    def compress(self, name):
+        """Write the compressed variants of a stored file; returns how many were kept."""
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < MIN_SIZE:
+            return 0
+        written = 0
+        for _, suffix, compress in encoders():
+            compressed = compress(data)
+            if len(compressed) <= len(data) * MAX_RATIO:
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+        return written
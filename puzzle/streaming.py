@@ -0,0 +1,118 @@
+"""Server-Sent Events feed of grading feedback for the solve page.
+
+When the user's coding submission is still pending, the feed claims it and
+grades it in the request, relaying the LLM validator's output as ``token``
+events while it is generated; the verdict is saved once the stream completes
+and sent as a final ``verdict`` event. If the grading worker got to the
+submission first, the feed waits for its outcome instead. Either way the
+page shows something as soon as the first chunk arrives rather than after
+the whole response.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import grading
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'KEEPALIVE': 15,       # seconds between comment lines while nothing else is sent
+    'POLL_INTERVAL': 1,    # seconds between checks on a submission graded elsewhere
+    'WAIT_SECONDS': 120,   # how long to wait for a submission graded elsewhere
+}
+
+FINISHED = ('completed', 'failed', 'error')
+
+# The event loop only keeps weak references to tasks; these keep grading
+# tasks alive after their stream's client has gone away
+_grading_tasks = set()
+
+
+def get_settings():
+    return {**DEFAULTS, **getattr(settings, 'PUZZLE_FEEDBACK_STREAM', {})}
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def verdict_payload(status, is_correct, feedback):
+    feedback = feedback or {}
+    return {
+        'status': status,
+        'is_correct': is_correct,
+        'message': feedback.get('message', ''),
+        'errors': feedback.get('errors', []),
+    }
+
+
+async def feedback_events(user, puzzle_id):
+    """Yield the SSE stream for the user's submission to a puzzle."""
+    options = get_settings()
+    submission = await sync_to_async(grading.claim_user_submission)(user, puzzle_id)
+    if submission is None:
+        async for event in _wait_for_outcome(user, puzzle_id, options):
+            yield event
+        return
+
+    chunks = asyncio.Queue()
+    # The task saves the verdict even if the client goes away mid-stream
+    task = asyncio.create_task(grading.agrade_submission(submission, on_token=chunks.put_nowait))
+    _grading_tasks.add(task)
+    task.add_done_callback(_grading_tasks.discard)
+    yield sse_event('grading', {'status': 'running'})
+    getter = None
+    try:
+        while not (task.done() and chunks.empty()):
+            getter = asyncio.ensure_future(chunks.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=options['KEEPALIVE'],
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield sse_event('token', {'text': getter.result()})
+                continue
+            getter.cancel()
+            if not done:
+                yield ': keep-alive\n\n'
+    finally:
+        # Closed or cancelled mid-wait when the client disconnects
+        if getter is not None and not getter.done():
+            getter.cancel()
+
+    try:
+        submission = task.result()
+    except Exception as e:
+        logger.error(f"Streamed grading failed for submission {submission.pk}: {str(e)}", exc_info=e)
+        yield sse_event('verdict', verdict_payload('error', False, {
+            'message': "An error occurred during validation. Please try again.",
+        }))
+        return
+    yield sse_event('verdict', verdict_payload(submission.status, submission.is_correct, submission.feedback))
+
+
+async def _wait_for_outcome(user, puzzle_id, options):
+    submissions = Submission.objects.filter(user=user, puzzle_id=puzzle_id).values('status', 'is_correct', 'feedback')
+    deadline = time.monotonic() + options['WAIT_SECONDS']
+    last_sent = time.monotonic()
+    while True:
+        row = await submissions.afirst()
+        if row is None:
+            yield sse_event('verdict', verdict_payload(None, False, {'message': "No submission to grade."}))
+            return
+        if row['status'] in FINISHED:
+            yield sse_event('verdict', verdict_payload(row['status'], row['is_correct'], row['feedback']))
+            return
+        if time.monotonic() >= deadline:
+            # Let the page fall back to polling the status endpoint
+            yield sse_event('timeout', {'status': row['status']})
+            return
+        if time.monotonic() - last_sent >= options['KEEPALIVE']:
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(options['POLL_INTERVAL'])
@@ -0,0 +1,45 @@
+"""Test runner for the file-backed SQLite test database (see DATABASES in settings).
+
+The test database runs in WAL mode, so until a checkpoint part of it lives in
+a -wal file next to it. Django clones the database for --parallel workers by
+copying the main file only, which would give each worker a copy without the
+migrated tables; the runner checkpoints the WAL first. It also removes the
+-wal and -shm files a destroyed test database can leave in the temp dir.
+"""
+import os
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+SIDECARS = ('-wal', '-shm')
+
+
+def _checkpointed(connection, clone_test_db):
+    def clone(*args, **kwargs):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return clone_test_db(*args, **kwargs)
+    return clone
+
+
+class TestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        for connection in connections.all():
+            if connection.vendor == 'sqlite':
+                connection.creation.clone_test_db = _checkpointed(connection, connection.creation.clone_test_db)
+        return super().setup_databases(**kwargs)
+
+    def teardown_databases(self, old_config, **kwargs):
+        names = []
+        for connection in connections.all():
+            if connection.vendor == 'sqlite' and not connection.is_in_memory_db():
+                names.append(connection.settings_dict['NAME'])
+                names.extend(connection.creation.get_test_db_clone_settings(str(index))['NAME']
+                             for index in range(1, (self.parallel or 1) + 1))
+        super().teardown_databases(old_config, **kwargs)
+        for name in names:
+            for sidecar in SIDECARS:
+                try:
+                    os.remove(f'{name}{sidecar}')
+                except FileNotFoundError:
+                    pass
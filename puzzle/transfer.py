@@ -0,0 +1,227 @@
+"""JSONL export and import of the puzzle bank.
+
+One puzzle per line, keyed by its ``uid`` so a bank can be moved between
+environments and re-imported idempotently. Both directions stream: export
+walks the table with a server-side iterator and import works through the
+input one batch at a time, so memory stays bounded by the batch size. Each
+import batch is upserted in its own transaction with one query to find which
+uids exist and a bulk_create that updates rows whose uid conflicts. Puzzles
+whose title repeats another puzzle's (and, on request, near duplicates) are
+dropped through the batched index lookups in puzzle.dedupe.
+"""
+import gzip
+import io
+import json
+import sys
+import uuid
+from collections import Counter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import catalog, content_cache, dedupe
+from .models import Puzzle, SiteStats
+
+EXPORT_FIELDS = ['uid', 'title', 'description', 'category', 'level', 'puzzle_type', 'points',
+                 'test_cases', 'solution', 'expected_output', 'starter_code', 'created_at']
+# Fields an import overwrites on an existing puzzle
+UPDATE_FIELDS = ['title', 'description', 'category', 'level', 'puzzle_type', 'points',
+                 'test_cases', 'solution', 'expected_output', 'starter_code', 'title_hash', 'signature']
+BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 20
+
+CATEGORIES = {code for code, _ in Puzzle.CATEGORIES}
+LEVELS = {code for code, _ in Puzzle.LEVEL_CHOICES}
+
+
+def open_output(path):
+    """A text stream for path: stdout for '-', gzip-compressed for *.gz."""
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        # Level 6 compresses about as well as the default 9 in well under half the time
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8')
+
+
+def open_input(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def export_puzzles(out, queryset=None, chunk_size=BATCH_SIZE):
+    """Write puzzles as JSON lines in primary-key order; returns the number written."""
+    queryset = Puzzle.objects.all() if queryset is None else queryset
+    count = 0
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in queryset.order_by('pk').values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        # DjangoJSONEncoder would cut the timestamp to milliseconds
+        row['created_at'] = row['created_at'].isoformat()
+        out.write(encoder.encode(row))
+        out.write('\n')
+        count += 1
+    return count
+
+
+def parse_line(line):
+    """Build an unsaved Puzzle from one JSONL record; raises ValueError if it is invalid."""
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}") from None
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    missing = [field for field in ('title', 'description', 'category', 'level') if not data.get(field)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if data['category'] not in CATEGORIES:
+        raise ValueError(f"unknown category {data['category']!r}")
+    if data['level'] not in LEVELS:
+        raise ValueError(f"unknown level {data['level']!r}")
+    try:
+        uid = uuid.UUID(str(data['uid'])) if data.get('uid') else uuid.uuid4()
+        points = int(data.get('points', 10))
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e)) from None
+    test_cases = data.get('test_cases') or {}
+    if not isinstance(test_cases, (dict, list)):
+        raise ValueError("test_cases must be an object or a list")
+
+    puzzle = Puzzle(
+        uid=uid,
+        title=str(data['title'])[:Puzzle._meta.get_field('title').max_length],
+        description=data['description'],
+        category=data['category'],
+        level=data['level'],
+        # Same rule as Puzzle.save(), which bulk writes bypass
+        puzzle_type='mcq' if data['level'] == 'beginner' else 'code',
+        points=points,
+        test_cases=test_cases,
+        solution=data.get('solution') or '',
+        expected_output=data.get('expected_output'),
+        starter_code=data.get('starter_code'),
+    )
+    if data.get('created_at'):
+        puzzle.created_at = parse_datetime(data['created_at']) or puzzle.created_at
+    puzzle.set_fingerprint()
+    return puzzle
+
+
+def _write(puzzles):
+    # INSERT ... ON CONFLICT (uid) DO UPDATE: one statement per batch for new and existing rows alike
+    Puzzle.objects.bulk_create(puzzles, update_conflicts=True, unique_fields=['uid'],
+                               update_fields=UPDATE_FIELDS, batch_size=500)
+
+
+def _write_one(puzzle):
+    try:
+        with transaction.atomic():
+            _write([puzzle])
+    except IntegrityError:
+        return False
+    return True
+
+
+def _stats_deltas(rows, existing):
+    """SiteStats counter changes for the created puzzles and the updated ones that changed level."""
+    deltas = Counter()
+    for puzzle in rows:
+        new_field = SiteStats.LEVEL_FIELDS.get(puzzle.level)
+        if puzzle.uid not in existing:
+            deltas['total_puzzles'] += 1
+            if new_field:
+                deltas[new_field] += 1
+            continue
+        old_field = SiteStats.LEVEL_FIELDS.get(existing[puzzle.uid][1])
+        if old_field and new_field and old_field != new_field:
+            deltas[old_field] -= 1
+            deltas[new_field] += 1
+    return deltas
+
+
+def _upsert_batch(batch, update_existing, skip_near):
+    # A uid repeated within the batch: the last line wins
+    by_uid = {puzzle.uid: (number, puzzle) for number, puzzle in batch}
+    existing = {uid: (pk, level) for uid, pk, level in
+                Puzzle.objects.filter(uid__in=list(by_uid)).values_list('uid', 'pk', 'level')}
+    candidates = [entry for uid, entry in by_uid.items() if update_existing or uid not in existing]
+    # A title another puzzle already has would violate the unique title_hash index
+    duplicates = dedupe.find_duplicates([puzzle for _, puzzle in candidates], near=skip_near)
+    rejected = []
+    rows = []
+    for index, (number, puzzle) in enumerate(candidates):
+        if index in duplicates:
+            reason, other = duplicates[index]
+            kind = 'duplicate' if reason == 'exact' else 'near duplicate'
+            rejected.append((number, f"{kind} of {f'puzzle {other}' if other else 'an earlier line'}"))
+        else:
+            rows.append((number, puzzle))
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                _write([puzzle for _, puzzle in rows])
+        except IntegrityError:
+            # A title stored by another writer since the check; keep the rest of the batch
+            kept = []
+            for number, puzzle in rows:
+                puzzle.pk = None
+                if _write_one(puzzle):
+                    kept.append((number, puzzle))
+                else:
+                    rejected.append((number, "duplicate of a puzzle stored during the import"))
+            rows = kept
+        rows = [puzzle for _, puzzle in rows]
+        for puzzle in rows:
+            puzzle.pk = puzzle.pk or existing[puzzle.uid][0]
+        updated = [existing[puzzle.uid][0] for puzzle in rows if puzzle.uid in existing]
+        dedupe.index_puzzles(rows, replace=bool(updated))
+        # Bulk writes skip the post_save receivers that keep the dashboard counters in step
+        SiteStats.increment(**_stats_deltas(rows, existing))
+    return len(rows) - len(updated), updated, rejected
+
+
+def import_puzzles(lines, batch_size=BATCH_SIZE, update_existing=True, skip_near=False):
+    """Upsert puzzles from JSON lines by uid.
+
+    Invalid lines and duplicates of another puzzle's title (or, with
+    skip_near, of its title and description) are skipped and reported.
+    Returns a dict with the created, updated, skipped and duplicate counts and
+    the first MAX_REPORTED_ERRORS problems as (line number, message) pairs.
+    """
+    result = {'created': 0, 'updated': 0, 'skipped': 0, 'duplicates': 0, 'errors': []}
+    updated_ids = []
+    batch = []
+
+    def flush():
+        created, updated, rejected = _upsert_batch(batch, update_existing, skip_near)
+        result['created'] += created
+        result['updated'] += len(updated)
+        result['duplicates'] += len(rejected)
+        result['errors'].extend(rejected[:MAX_REPORTED_ERRORS - len(result['errors'])])
+        updated_ids.extend(updated)
+        batch.clear()
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            batch.append((number, parse_line(line)))
+        except ValueError as e:
+            result['skipped'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append((number, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if result['created'] or result['updated']:
+        # Bulk writes skip the post_save receivers; drop the cached pages once
+        catalog.bump_version()
+        content_cache.bump_versions(updated_ids)
+    return result
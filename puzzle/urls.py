@@ -9,9 +9,12 @@ urlpatterns = [
     path('puzzle/<int:puzzle_id>/', views.puzzle_detail, name='detail'),
     path('puzzle/<int:puzzle_id>/solve/', views.solve_puzzle, name='solve'),
     path('puzzle/<int:puzzle_id>/submit/', views.submit_solution, name='submit'),
+    path('puzzle/<int:puzzle_id>/status/', views.submission_status, name='status'),
+    path('puzzle/<int:puzzle_id>/stream/', views.stream_feedback, name='stream'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('login/', views.CustomLoginView.as_view(), name='login'),
     path('signup/', views.signup, name='signup'),
     path('profile/', views.profile, name='profile'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('logout/', LogoutView.as_view(), name='logout'),  # Updated logout view
 ]
\ No newline at end of file
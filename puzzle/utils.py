@@ -0,0 +1,20 @@
+import base64
+import json
+
+
+def encode_cursor(values):
+    """Encode the sort key of a row as an opaque keyset pagination cursor."""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor produced by encode_cursor, or return None if it is invalid."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
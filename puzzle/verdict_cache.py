@@ -0,0 +1,240 @@
+"""Content-addressed cache for LLM validation verdicts.
+
+Verdicts are keyed by a hash of the puzzle's description and test cases plus
+an AST-normalized form of the submitted code, so resubmissions that differ
+only in whitespace or comments reuse the earlier verdict. Lookups go through
+an in-process LRU, then the VerdictCacheEntry table, and concurrent misses for
+the same key share a single in-flight validation, whether the callers are
+threads (get_or_validate) or coroutines (aget_or_validate).
+"""
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import VerdictCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Bump when the validation prompt changes so stale verdicts are not reused
+KEY_VERSION = 1
+
+DEFAULTS = {
+    'LRU_SIZE': 1024,
+    'TTL_SECONDS': 7 * 24 * 3600,
+    'MAX_ENTRIES': 100000,
+    'WAIT_SECONDS': 60,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'VERDICT_CACHE', {}))
+    return config
+
+
+def normalize_code(code):
+    """Return a canonical form of the code that ignores formatting and comments."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        # Not valid Python; fall back to collapsing whitespace
+        return ' '.join(code.split())
+    return ast.dump(tree, annotate_fields=False, include_attributes=False)
+
+
+def make_key(puzzle, code):
+    puzzle_part = json.dumps(
+        [puzzle.description, puzzle.test_cases], sort_keys=True, default=str
+    )
+    digest = hashlib.sha256()
+    digest.update(f'v{KEY_VERSION}\0'.encode())
+    digest.update(puzzle_part.encode())
+    digest.update(b'\0')
+    digest.update(normalize_code(code).encode())
+    return digest.hexdigest()
+
+
+class VerdictCache:
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self._lru = TTLCache(maxsize=self.config['LRU_SIZE'], ttl=self.config['TTL_SECONDS'])
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {'lru_hits': 0, 'db_hits': 0, 'coalesced': 0, 'misses': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _lru_get(self, key):
+        with self._lock:
+            return self._lru.get(key)
+
+    def _lru_set(self, key, verdict):
+        with self._lock:
+            self._lru[key] = verdict
+
+    def _db_get(self, key):
+        entry = (VerdictCacheEntry.objects
+                 .filter(key=key, expires_at__gt=timezone.now())
+                 .values('pk', 'verdict')
+                 .first())
+        if entry is None:
+            return None
+        VerdictCacheEntry.objects.filter(pk=entry['pk']).update(hits=F('hits') + 1)
+        return entry['verdict']
+
+    def _db_set(self, key, verdict):
+        expires_at = timezone.now() + timedelta(seconds=self.config['TTL_SECONDS'])
+        try:
+            VerdictCacheEntry.objects.update_or_create(
+                key=key, defaults={'verdict': verdict, 'expires_at': expires_at}
+            )
+        except IntegrityError:
+            # Another process stored the same verdict first
+            pass
+
+    def _join_flight(self, key):
+        """Return (flight, leader): the in-flight validation for a key, started by us if leader."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                # A concurrent.futures.Future can be waited on from threads and event loops alike
+                flight = self._flights[key] = Future()
+                return flight, True
+            return flight, False
+
+    def _land_flight(self, key, flight, verdict=None, error=None):
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(verdict)
+
+    def get_or_validate(self, puzzle, code, validate):
+        """Return the cached verdict for this puzzle/code, calling validate(puzzle, code) on a miss."""
+        key = make_key(puzzle, code)
+
+        verdict = self._lru_get(key)
+        if verdict is not None:
+            self._count('lru_hits')
+            return dict(verdict, cached=True)
+
+        flight, leader = self._join_flight(key)
+        if not leader:
+            # An identical submission is already being validated; wait for its verdict
+            self._count('coalesced')
+            try:
+                return dict(flight.result(self.config['WAIT_SECONDS']), cached=True)
+            except TimeoutError:
+                raise TimeoutError("Timed out waiting for an in-flight validation") from None
+
+        try:
+            verdict = self._db_get(key)
+            if verdict is not None:
+                self._count('db_hits')
+                self._lru_set(key, verdict)
+                self._land_flight(key, flight, verdict)
+                return dict(verdict, cached=True)
+
+            self._count('misses')
+            verdict = validate(puzzle, code)
+            self._lru_set(key, verdict)
+            self._db_set(key, verdict)
+        except BaseException as e:
+            self._land_flight(key, flight, error=e)
+            raise
+        self._land_flight(key, flight, verdict)
+        return verdict
+
+    async def aget_or_validate(self, puzzle, code, validate):
+        """Async version of get_or_validate(); ``validate`` is a coroutine function."""
+        key = make_key(puzzle, code)
+
+        verdict = self._lru_get(key)
+        if verdict is not None:
+            self._count('lru_hits')
+            return dict(verdict, cached=True)
+
+        flight, leader = self._join_flight(key)
+        if not leader:
+            self._count('coalesced')
+            try:
+                # shield() so a timed-out waiter doesn't cancel the leader's flight
+                verdict = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(flight)), self.config['WAIT_SECONDS']
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError("Timed out waiting for an in-flight validation") from None
+            return dict(verdict, cached=True)
+
+        try:
+            verdict = await sync_to_async(self._db_get)(key)
+            if verdict is not None:
+                self._count('db_hits')
+                self._lru_set(key, verdict)
+                self._land_flight(key, flight, verdict)
+                return dict(verdict, cached=True)
+
+            self._count('misses')
+            verdict = await validate(puzzle, code)
+            self._lru_set(key, verdict)
+            await sync_to_async(self._db_set)(key, verdict)
+        except BaseException as e:
+            self._land_flight(key, flight, error=e)
+            raise
+        self._land_flight(key, flight, verdict)
+        return verdict
+
+    def stats(self):
+        """Return hit counters for this process and for the persistent tier."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = sum(stats.values())
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0.0
+
+        totals = VerdictCacheEntry.objects.aggregate(hits=Sum('hits'))
+        entries = VerdictCacheEntry.objects.count()
+        persistent_hits = totals['hits'] or 0
+        # Every entry was created by exactly one miss
+        stats['db_entries'] = entries
+        stats['db_hit_rate'] = (
+            persistent_hits / (persistent_hits + entries) if entries else 0.0
+        )
+        return stats
+
+    def prune(self):
+        """Delete expired entries and trim the table to MAX_ENTRIES, oldest first."""
+        deleted, _ = VerdictCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+        overflow = VerdictCacheEntry.objects.count() - self.config['MAX_ENTRIES']
+        while overflow > 0:
+            oldest = list(VerdictCacheEntry.objects.order_by('created_at')
+                          .values_list('pk', flat=True)[:min(overflow, 1000)])
+            if not oldest:
+                break
+            evicted, _ = VerdictCacheEntry.objects.filter(pk__in=oldest).delete()
+            deleted += evicted
+            overflow -= len(oldest)
+        logger.info(f"Evicted {deleted} cached verdicts")
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+        VerdictCacheEntry.objects.all().delete()
+
+
+verdict_cache = VerdictCache()
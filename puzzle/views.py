@@ -1,4 +1,7 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import login, logout
@@ -6,41 +9,28 @@ from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
 from .models import Puzzle, Submission, UserProfile
 from .forms import PuzzleSubmissionForm, SignUpForm, EmailAuthenticationForm
-import google.generativeai as genai
-from decouple import config
-import json
+from . import catalog, content_cache, drafts, grading, history, llm, metrics, ranking, solved_set, streaming
+from .utils import encode_cursor, decode_cursor
 import logging
-import re
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API globally
-genai.configure(api_key=config('GEMINI_API_KEY'))
-gemini_pro = genai.GenerativeModel('gemini-pro')
-gemini_mini = genai.GenerativeModel('gemini-1.5-flash')
-
 @login_required
 def index(request):
-    """Display all puzzles ordered by category and level with filtering."""
-    category_filter = request.GET.get('category', 'all')
-    level_filter = request.GET.get('level', 'all')
-    
-    puzzles = Puzzle.objects.all()
-    
-    if category_filter != 'all':
-        puzzles = puzzles.filter(category=category_filter)
-    
-    if category_filter != 'all' and level_filter != 'all':
-        puzzles = puzzles.filter(level=level_filter)
-    
-    for puzzle in puzzles:
-        puzzle.level_display = puzzle.get_level_display()
-        puzzle.category_display = puzzle.get_category_display()
-        puzzle.type_display = 'MCQ' if puzzle.puzzle_type == 'mcq' else 'Coding'
-    
+    """Display puzzles ordered by level and age, filtered by category/level and paginated by cursor."""
+    category_filter, level_filter = catalog.normalize_filters(
+        request.GET.get('category', 'all'), request.GET.get('level', 'all')
+    )
+
+    puzzles, next_cursor = catalog.get_index_page(
+        category_filter, level_filter, request.GET.get('after'), request.user.userprofile
+    )
+
     return render(request, 'puzzle/index.html', {
         'puzzles': puzzles,
+        'next_cursor': next_cursor,
+        'is_first_page': 'after' not in request.GET,
         'current_category': category_filter,
         'current_level': level_filter,
         'categories': Puzzle.CATEGORIES,
@@ -50,25 +40,41 @@ def index(request):
 @login_required
 def puzzle_detail(request, puzzle_id):
     """Display puzzle details and redirect to solve page for submission."""
-    puzzle = get_object_or_404(Puzzle, pk=puzzle_id)
+    puzzle = content_cache.get_puzzle_or_404(puzzle_id)
     user_profile = request.user.userprofile
     existing_submission = Submission.objects.filter(user=request.user, puzzle=puzzle).first()
 
     context = {
         'puzzle': puzzle,
         'submission': existing_submission,
-        'is_solved': puzzle in user_profile.solved_puzzles.all(),
+        'is_solved': puzzle.pk in solved_set.for_profile(user_profile),
         'type_display': 'MCQ' if puzzle.puzzle_type == 'mcq' else 'Coding',
     }
     return render(request, 'puzzle/detail.html', context)
 
 @login_required
-def solve_puzzle(request, puzzle_id):
-    """Handle puzzle solving with LLM validation for coding puzzles and allow retries."""
-    puzzle = get_object_or_404(Puzzle, pk=puzzle_id)
-    user_profile = request.user.userprofile
+async def solve_puzzle(request, puzzle_id):
+    """Handle puzzle solving: MCQs are checked immediately, coding puzzles are queued for grading.
+
+    Async so that inline grading awaits the LLM on the event loop; the ORM,
+    session and form work runs in the request's sync thread.
+    """
+    # login_required loaded the user through auser(); don't load it again for request.user
+    request.user = await request.auser()
+    response, inline_submission = await sync_to_async(_solve_puzzle)(request, puzzle_id)
+    if inline_submission is not None:
+        await grading.agrade_submission(inline_submission)
+    return response
+
+def _solve_puzzle(request, puzzle_id):
+    """Return the solve page response, plus a submission to grade in the request (or None)."""
+    puzzle = content_cache.get_puzzle_or_404(puzzle_id)
     existing_submission = Submission.objects.filter(user=request.user, puzzle=puzzle).first()
-    stored_code = request.session.get(f'retry_code_{puzzle_id}', '')
+    if puzzle.puzzle_type == 'code':
+        # Drafts used to live in the session; move any left there into the draft store
+        legacy_code = request.session.pop(f'retry_code_{puzzle_id}', None)
+        if legacy_code:
+            drafts.save(request.user.pk, puzzle_id, legacy_code)
 
     if request.method == 'POST':
         form = PuzzleSubmissionForm(request.POST, puzzle=puzzle)
@@ -83,94 +89,30 @@ def solve_puzzle(request, puzzle_id):
             if puzzle.puzzle_type == 'mcq':
                 submission.answer = form.cleaned_data['answer']
                 submission.status = 'completed'
-            else:
-                submission.code = form.cleaned_data['code']
-                submission.status = 'pending'
-
-            # Rest of validation logic remains the same
-            if puzzle.puzzle_type == 'mcq':
                 submission.save()
+                grading.log_attempt(submission)
                 if submission.is_correct:
-                    if not existing_submission or not existing_submission.is_correct:
-                        user_profile.total_points += puzzle.points
-                        user_profile.puzzles_solved += 1
-                        user_profile.solved_puzzles.add(puzzle)
-                        user_profile.save()
+                    grading.record_solve(request.user, puzzle)
                     messages.success(request, f"Correct! You earned {puzzle.points} points!")
-                    return redirect('puzzle:detail', puzzle_id=puzzle_id)
+                    return redirect('puzzle:detail', puzzle_id=puzzle_id), None
                 else:
                     messages.error(request, "Incorrect solution.")
                     form = PuzzleSubmissionForm(puzzle=puzzle, initial={'answer': form.cleaned_data['answer']})
             else:  # Coding puzzle
                 user_code = form.cleaned_data['code']
                 submission.code = user_code
-                submission.status = 'pending'  # Set initial status for coding puzzles
-
-                validation_prompt = f"""
-                    Validate this Python code solution against the problem description. Respond ONLY with a JSON object.
-                    Problem: {puzzle.description}
-                    
-                    Code:
-                    ```python
-                    {user_code}
-                    ```
-                    
-                    Return a JSON object with these fields:
-                    - is_valid: boolean
-                    - message: string (explanation)
-                    - errors: array of strings (if any)
-                """
-
-                try:
-                    response = gemini_mini.generate_content(validation_prompt)
-                    # Add response cleaning and better error handling
-                    response_text = response.text.strip()
-                    # Try to extract JSON if it's wrapped in ```json or ``` blocks
-                    json_match = re.search(r'```(?:json)?\s*(.*?)\s*```', response_text, re.DOTALL)
-                    if json_match:
-                        response_text = json_match.group(1)
-                    
-                    try:
-                        validation_result = json.loads(response_text)
-                        logger.debug(f"Validation result: {validation_result}")
-                        
-                        if not isinstance(validation_result, dict):
-                            raise ValueError("Validation result is not a dictionary")
-                        
-                        if 'is_valid' not in validation_result or 'message' not in validation_result:
-                            raise ValueError("Missing required fields in validation result")
-                        
-                        if validation_result['is_valid']:
-                            submission.is_correct = True
-                            submission.status = 'completed'
-                            submission.save()
-                            if not existing_submission or not existing_submission.is_correct:
-                                user_profile.total_points += puzzle.points
-                                user_profile.puzzles_solved += 1
-                                user_profile.solved_puzzles.add(puzzle)
-                                user_profile.save()
-                            messages.success(request, f"Correct! You earned {puzzle.points} points!")
-                            return redirect('puzzle:detail', puzzle_id=puzzle_id)
-                        else:
-                            submission.status = 'failed'
-                            submission.save()
-                            error_message = validation_result.get('message', 'Invalid solution')
-                            messages.error(request, f"Incorrect solution: {error_message}")
-                            request.session[f'retry_code_{puzzle_id}'] = user_code
-                            
-                    except json.JSONDecodeError as je:
-                        logger.error(f"JSON parsing error: {str(je)}\nResponse text: {response_text}")
-                        messages.error(request, "Invalid response format from validation service.")
-                        submission.status = 'error'
-                        submission.save()
-                        
-                except Exception as e:
-                    logger.error(f"Validation error: {str(e)}\nFull traceback:", exc_info=True)
-                    messages.error(request, "An error occurred during validation. Please try again.")
-                    submission.status = 'error'
-                    submission.save()
+                drafts.save(request.user.pk, puzzle_id, user_code)
+                grading.enqueue_submission(submission)
+                # Redirect so the solve page can poll the submission status
+                response = redirect('puzzle:solve', puzzle_id=puzzle_id)
+                if settings.PUZZLE_GRADING_INLINE:
+                    # No grading worker running (e.g. local development): grade in the request
+                    return response, grading.claim_user_submission(request.user, puzzle_id)
+                messages.info(request, "Your solution has been submitted for grading.")
+                return response, None
 
     else:
+        stored_code = drafts.load(request.user.pk, puzzle_id) if puzzle.puzzle_type == 'code' else ''
         initial_data = {'code': stored_code} if stored_code else None
         form = PuzzleSubmissionForm(puzzle=puzzle, initial=initial_data)
 
@@ -178,17 +120,62 @@ def solve_puzzle(request, puzzle_id):
         'form': form,
         'puzzle': puzzle,
         'submission': existing_submission
+    }), None
+
+@login_required
+def submission_status(request, puzzle_id):
+    """Return the grading status of the user's submission for a puzzle as JSON."""
+    submission = (Submission.objects.filter(user=request.user, puzzle_id=puzzle_id)
+                  .values('status', 'is_correct', 'feedback')
+                  .first())
+    if submission is None:
+        return JsonResponse({'status': None}, status=404)
+    feedback = submission['feedback'] or {}
+    return JsonResponse({
+        'status': submission['status'],
+        'is_correct': submission['is_correct'],
+        'message': feedback.get('message', ''),
     })
 
+@login_required
+async def stream_feedback(request, puzzle_id):
+    """Grade the user's pending submission, streaming the validator's output as Server-Sent Events."""
+    user = await request.auser()
+    response = StreamingHttpResponse(streaming.feedback_events(user, puzzle_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def submit_solution(request, puzzle_id):
     """Handle puzzle solution submission (alternative entry point)."""
     return puzzle_detail(request, puzzle_id)  # Reuse puzzle_detail view logic
 
+def _leaderboard_cursor(token):
+    try:
+        points, profile_id = decode_cursor(token)
+        return int(points), int(profile_id)
+    except (TypeError, ValueError):
+        return None
+
 def leaderboard(request):
-    """Display the top 10 users by points."""
-    top_users = UserProfile.objects.all().order_by('-total_points')[:10]
-    return render(request, 'puzzle/leaderboard.html', {'top_users': top_users})
+    """Display the leaderboard one keyset page at a time, plus the user's own neighbourhood."""
+    after = _leaderboard_cursor(request.GET.get('after'))
+    before = _leaderboard_cursor(request.GET.get('before'))
+    page = ranking.get_page(after=after, before=None if after else before)
+    rows = page['rows']
+
+    around_me = None
+    if request.user.is_authenticated:
+        around_me = ranking.around(request.user.userprofile)
+
+    return render(request, 'puzzle/leaderboard.html', {
+        'top_users': rows,
+        'around_me': around_me,
+        'next_cursor': encode_cursor(ranking.cursor_key(rows[-1])) if page['has_next'] else None,
+        'previous_cursor': encode_cursor(ranking.cursor_key(rows[0])) if page['has_previous'] else None,
+    })
 
 class CustomLoginView(LoginView):
     """Custom login view using email authentication."""
@@ -217,16 +204,32 @@ def signup(request):
 
 @login_required
 def profile(request):
+    """Show the user's stats, a per-category summary and a cursor-paginated submission history."""
     user_profile = request.user.userprofile
-    submissions = Submission.objects.filter(user=request.user).order_by('-submitted_at')
+    submissions, next_cursor = history.get_history_page(request.user, request.GET.get('after'))
     context = {
         'user_profile': user_profile,
         'submissions': submissions,
+        'next_cursor': next_cursor,
+        'is_first_page': 'after' not in request.GET,
+        'summary': history.get_summary(request.user),
+        'recent_solved': history.get_recent_solved(user_profile),
         'total_points': user_profile.total_points,
         'puzzles_solved': user_profile.puzzles_solved,
     }
     return render(request, 'puzzle/profile.html', context)
 
+def prometheus_metrics(request):
+    """Serve this process's request and LLM aggregates in the Prometheus text format."""
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if not (request.user.is_staff or request.META.get('REMOTE_ADDR') in allowed_ips):
+        return HttpResponseForbidden()
+    gauges = {}
+    llm_stats = llm.current_stats()
+    if llm_stats:
+        gauges['puzzle_llm_in_flight'] = ("LLM calls currently in flight.", llm_stats['in_flight'])
+    return HttpResponse(metrics.registry.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def logout_view(request):
     """Handle user logout."""
     if request.method == 'POST':
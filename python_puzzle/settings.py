@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
+from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,7 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "puzzle.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "puzzle.middleware.StaticAssetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -55,7 +59,7 @@ ROOT_URLCONF = "python_puzzle.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "puzzle.template_backends.TimedDjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, 'templates')],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -75,11 +79,87 @@ WSGI_APPLICATION = "python_puzzle.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgresql switches to PostgreSQL (DB_NAME, DB_USER, DB_PASSWORD,
+# DB_HOST, DB_PORT); otherwise SQLite, tuned for concurrent writers unless
+# SQLITE_TUNED=False: WAL lets readers run alongside the single writer,
+# IMMEDIATE transactions take the write lock up front (a deferred read->write
+# upgrade fails at once with "database is locked" instead of waiting), and
+# writers queue for up to SQLITE_TIMEOUT seconds.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config('DB_NAME', default='python_puzzle'),
+            "USER": config('DB_USER', default='postgres'),
+            "PASSWORD": config('DB_PASSWORD', default=''),
+            "HOST": config('DB_HOST', default='localhost'),
+            "PORT": config('DB_PORT', default='5432'),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            # A file test database, so threaded tests get real WAL locking. It lives in the
+            # temp dir, named per run so concurrent runs don't share it; the environment
+            # variable carries the name to parallel test workers started with spawn
+            "TEST": {"NAME": os.environ.setdefault(
+                'PUZZLE_TEST_DB', os.path.join(tempfile.gettempdir(), f'python_puzzle_test_{os.getpid()}.sqlite3')
+            )},
+        }
+    }
+    # Checkpoints the WAL before --parallel clones the file, and cleans up after it
+    TEST_RUNNER = 'puzzle.test_runner.TestRunner'
+    if config('SQLITE_TUNED', default=True, cast=bool):
+        DATABASES["default"]["OPTIONS"] = {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": config('SQLITE_TIMEOUT', default=20, cast=int),
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA mmap_size=134217728;"
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA cache_size=-20000;"
+            ),
+        }
+
+# Shared cache for puzzle content, catalog pages and solved sets. REDIS_URL
+# (e.g. redis://localhost:6379/0, needs `pip install redis`) shares it between
+# worker processes; without it each process keeps its own in-memory cache.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
     }
+
+# Versioned puzzle content cache (puzzle/content_cache.py)
+PUZZLE_CACHE = {
+    'LOCAL_SIZE': 512,
+    'TIMEOUT': 3600,
+    'VERSION_TTL': 2,
+}
+
+# Solve-page code drafts (puzzle/drafts.py): compressed size cap and hot-tier lifetime
+PUZZLE_DRAFTS = {
+    'MAX_BYTES': 32 * 1024,
+    'TIMEOUT': 3600,
 }
 
 
@@ -121,6 +201,87 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+# `collectstatic` writes content-hashed copies plus .gz (and .br with `pip install brotli`)
+# variants here; StaticAssetMiddleware serves them with immutable cache headers
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "puzzle.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# Sandbox used to grade coding puzzles against their test cases (puzzle/sandbox.py).
+# Needs Linux and root to set up namespaces; otherwise coding puzzles use the LLM.
+PUZZLE_SANDBOX = {
+    'WORKERS': 2,          # sandboxed interpreters running at once
+    'CPU_SECONDS': 2,      # CPU time per test case
+    'MEMORY_MB': 256,      # address space per test case
+    'WALL_SECONDS': 5,     # wall clock per test case
+    'USER': 'nobody',      # unprivileged account submissions run as
+    'PYTHON': '/usr/bin/python3',  # interpreter for submissions; must be readable by USER, so not a venv under /root
+    # 'HIDDEN_PATHS': [BASE_DIR],    # directories submissions see as empty
+}
+
+# Coding submissions are queued and graded by `manage.py grade_submissions`.
+# Set to True to grade inside the request when no worker is running.
+PUZZLE_GRADING_INLINE = False
+
+# The solve page streams grading feedback over Server-Sent Events
+# (puzzle/streaming.py), claiming the submission itself; the worker leaves new
+# submissions to it for this many seconds.
+PUZZLE_STREAM_CLAIM_GRACE = 5
+PUZZLE_FEEDBACK_STREAM = {
+    'KEEPALIVE': 15,
+    'POLL_INTERVAL': 1,
+    'WAIT_SECONDS': 120,
+}
+
+# Cache of LLM validation verdicts (in-process LRU in front of the database)
+VERDICT_CACHE = {
+    'LRU_SIZE': 1024,
+    'TTL_SECONDS': 7 * 24 * 3600,
+    'MAX_ENTRIES': 100000,
+}
+
+# Per-request SQL/template/LLM timings (puzzle/middleware.py): sent as a
+# Server-Timing header and aggregated in memory for the /metrics endpoint,
+# which staff users and these addresses may read.
+SERVER_TIMING = True
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# LLM client (puzzle/llm.py). LLM_BACKEND=stub answers deterministically
+# without network access, for CI and load tests.
+GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+LLM = {
+    'BACKEND': config('LLM_BACKEND', default='gemini'),
+    'MODEL': 'gemini-1.5-flash',
+    'TIMEOUT': config('LLM_TIMEOUT', default=30, cast=float),
+    'RETRIES': 2,
+    'BACKOFF': 0.5,
+    'MAX_CONCURRENCY': config('LLM_MAX_CONCURRENCY', default=4, cast=int),
+    'ASYNC_MAX_CONCURRENCY': config('LLM_ASYNC_MAX_CONCURRENCY', default=256, cast=int),
+    'STUB_LATENCY': config('LLM_STUB_LATENCY', default=0, cast=float),
+}
+
+# Attempts older than this are moved to the archive by `manage.py archive_attempts`
+ATTEMPT_RETENTION_DAYS = 90
+
+# Admin puzzle generation: chunks of CHUNK_SIZE prompted on WORKERS threads
+PUZZLE_GENERATION = {
+    'CHUNK_SIZE': 5,
+    'WORKERS': 4,
+    'MAX_PUZZLES': 100,
+}
+
+# Generation and import skip puzzles whose title and description are at least this similar
+# (estimated Jaccard over word pairs) to an existing puzzle
+PUZZLE_DEDUPE = {
+    'THRESHOLD': 0.5,
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -132,8 +293,9 @@ LOGIN_REDIRECT_URL = 'home'  # Change 'home' to your home page URL name
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 
+# Login accepts a username or an email address (case-insensitive, indexed)
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'puzzle.auth_backends.EmailOrUsernameBackend',
 ]
 # settings.py
 LOGIN_REDIRECT_URL = 'puzzle:index'  # Redirect to your main page